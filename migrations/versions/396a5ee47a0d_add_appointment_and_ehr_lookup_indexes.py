@@ -0,0 +1,58 @@
+import sqlmodel
+
+"""add appointment and ehr lookup indexes
+
+Revision ID: 396a5ee47a0d
+Revises: 992ef705d8f8
+Create Date: 2026-10-18 10:14:52.730914
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "396a5ee47a0d"
+down_revision: Union[str, None] = "992ef705d8f8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_appointment_patient_id_scheduled_time",
+        "appointment",
+        ["patient_id", "scheduled_time"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_appointment_doctor_id_scheduled_time",
+        "appointment",
+        ["doctor_id", "scheduled_time"],
+        unique=False,
+    )
+    # Fails if an appointment already has more than one EHR, those rows
+    # have to be merged by hand before upgrading
+    op.create_index(
+        op.f("ix_ehr_appointment_id"), "ehr", ["appointment_id"], unique=True
+    )
+    op.create_index(
+        op.f("ix_ehr_patient_id"), "ehr", ["patient_id"], unique=False
+    )
+    op.create_index(
+        "ix_ehr_doctor_id_id", "ehr", ["doctor_id", "id"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_ehr_doctor_id_id", table_name="ehr")
+    op.drop_index(op.f("ix_ehr_patient_id"), table_name="ehr")
+    op.drop_index(op.f("ix_ehr_appointment_id"), table_name="ehr")
+    op.drop_index(
+        "ix_appointment_doctor_id_scheduled_time", table_name="appointment"
+    )
+    op.drop_index(
+        "ix_appointment_patient_id_scheduled_time", table_name="appointment"
+    )
@@ -0,0 +1,31 @@
+import sqlmodel
+
+"""add user password_changed_at
+
+Revision ID: 5c1e0a7d9b42
+Revises: 396a5ee47a0d
+Create Date: 2026-10-18 16:02:11.408216
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5c1e0a7d9b42"
+down_revision: Union[str, None] = "396a5ee47a0d"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "users",
+        sa.Column("password_changed_at", sa.DateTime(), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("users", "password_changed_at")
@@ -0,0 +1,40 @@
+import sqlmodel
+
+"""add open appointment queue index
+
+Revision ID: 992ef705d8f8
+Revises: f860f0f16ab4
+Create Date: 2026-10-18 10:02:11.418305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "992ef705d8f8"
+down_revision: Union[str, None] = "f860f0f16ab4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Partial index backing the nurse queue: only appointments that are
+    # still open are indexed, completed ones never match the queue query
+    op.create_index(
+        "ix_appointment_open_status_scheduled_time",
+        "appointment",
+        ["status", "scheduled_time"],
+        unique=False,
+        postgresql_where=sa.text("status <> 'COMPLETED'"),
+        sqlite_where=sa.text("status <> 'COMPLETED'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_appointment_open_status_scheduled_time",
+        table_name="appointment",
+    )
@@ -0,0 +1,189 @@
+import asyncio
+import heapq
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from itertools import islice, repeat
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from uuid import UUID
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.api.appointment.model import Appointment, AppointmentStatus
+from src.core.broker import broker
+from src.core.config import settings
+
+AVAILABILITY_CHANNEL = "doctor_availability"
+# Times are kept as whole minutes since here, int arithmetic is several
+# times faster than datetime arithmetic in the slot search
+SLOT_EPOCH = datetime(2000, 1, 1)
+MINUTE = timedelta(minutes=1)
+# Keeps every IN list under the bind parameter limit of asyncpg
+DOCTORS_PER_QUERY = 1000
+
+
+def to_minutes(moment: datetime, round_up: bool = False) -> int:
+    minutes, remainder = divmod(moment - SLOT_EPOCH, MINUTE)
+    return minutes + 1 if round_up and remainder else minutes
+
+
+def from_minutes(minutes: int) -> datetime:
+    return SLOT_EPOCH + minutes * MINUTE
+
+
+def align_up(minutes: int, step: int) -> int:
+    return -(-minutes // step) * step
+
+
+class DoctorSchedule:
+    """Booked time of one doctor as sorted, non-overlapping intervals"""
+
+    __slots__ = ("starts", "ends")
+
+    def __init__(self, intervals: Iterable[Tuple[int, int]] = ()):
+        self.starts: List[int] = []
+        self.ends: List[int] = []
+        # Touching or overlapping bookings are merged, which keeps ends
+        # sorted as well, both lists can be searched with bisect
+        for start, end in sorted(intervals):
+            if self.ends and start <= self.ends[-1]:
+                self.ends[-1] = max(self.ends[-1], end)
+            else:
+                self.starts.append(start)
+                self.ends.append(end)
+
+    def free_slots(
+        self, start: int, end: int, duration: int, step: int
+    ) -> Iterator[int]:
+        """Slot starts on the step grid where duration fits, in order"""
+        slot = align_up(start, step)
+        while slot + duration <= end:
+            index = bisect_right(self.ends, slot)
+            if (
+                index == len(self.starts)
+                or self.starts[index] >= slot + duration
+            ):
+                yield slot
+                slot += step
+            else:
+                # Skip the whole booked interval in one jump
+                slot = align_up(self.ends[index], step)
+
+
+class AvailabilityIndex:
+    """Per-doctor interval index of booked appointments"""
+
+    def __init__(self) -> None:
+        self.schedules: Dict[UUID, DoctorSchedule] = {}
+        self.generation = 0
+        self.loads = 0
+        self._lock = asyncio.Lock()
+
+    async def schedules_for(
+        self, session: AsyncSession, doctor_ids: List[UUID]
+    ) -> Dict[UUID, DoctorSchedule]:
+        schedules = {
+            doctor_id: self.schedules[doctor_id]
+            for doctor_id in doctor_ids
+            if doctor_id in self.schedules
+        }
+        if len(schedules) < len(doctor_ids):
+            async with self._lock:
+                missing = [d for d in doctor_ids if d not in schedules]
+                schedules.update(await self._load(session, missing))
+        return schedules
+
+    async def _load(
+        self, session: AsyncSession, doctor_ids: List[UUID]
+    ) -> Dict[UUID, DoctorSchedule]:
+        # Another request may have loaded some while this one waited
+        loaded = {
+            doctor_id: self.schedules[doctor_id]
+            for doctor_id in doctor_ids
+            if doctor_id in self.schedules
+        }
+        doctor_ids = [d for d in doctor_ids if d not in loaded]
+        generation = self.generation
+        # Anything that can still overlap a slot from now on
+        since = datetime.now() - timedelta(
+            minutes=settings.APPOINTMENT_MAX_DURATION_MINUTES
+        )
+        intervals = {doctor_id: [] for doctor_id in doctor_ids}
+        for start in range(0, len(doctor_ids), DOCTORS_PER_QUERY):
+            end = start + DOCTORS_PER_QUERY
+            statement = select(
+                Appointment.doctor_id,
+                Appointment.scheduled_time,
+                Appointment.duration_minutes,
+            ).where(
+                Appointment.doctor_id.in_(doctor_ids[start:end]),
+                Appointment.scheduled_time >= since,
+                Appointment.status != AppointmentStatus.CANCELED,
+            )
+            for doctor_id, scheduled_time, duration in (
+                await session.exec(statement)
+            ).all():
+                booked = to_minutes(scheduled_time)
+                intervals[doctor_id].append((booked, booked + duration))
+        self.loads += 1
+        for doctor_id, booked in intervals.items():
+            loaded[doctor_id] = DoctorSchedule(booked)
+        # A change that landed during the load may be missing from it, it
+        # is still good enough to answer this request but is not kept
+        if self.generation == generation:
+            self.schedules.update(loaded)
+        return loaded
+
+    async def free_slots(
+        self,
+        session: AsyncSession,
+        doctor_ids: List[UUID],
+        start: datetime,
+        end: datetime,
+        duration: timedelta,
+        limit: int,
+    ) -> List[Tuple[datetime, UUID]]:
+        """The first `limit` free slots over all the doctors, by time"""
+        schedules = await self.schedules_for(session, doctor_ids)
+        start = to_minutes(start, round_up=True)
+        end = to_minutes(end)
+        duration = duration // MINUTE
+        step = settings.APPOINTMENT_SLOT_MINUTES
+        # Each doctor's slots come lazily, merge only pulls what it returns
+        per_doctor = [
+            zip(
+                schedule.free_slots(start, end, duration, step),
+                repeat(doctor_id),
+            )
+            for doctor_id, schedule in schedules.items()
+        ]
+        return [
+            (from_minutes(slot), doctor_id)
+            for slot, doctor_id in islice(heapq.merge(*per_doctor), limit)
+        ]
+
+    def invalidate(self, message: Optional[dict] = None) -> None:
+        self.generation += 1
+        doctor_id = (message or {}).get("doctor_id")
+        if doctor_id is None:
+            self.schedules.clear()
+        else:
+            self.schedules.pop(UUID(str(doctor_id)), None)
+
+    async def changed(self, doctor_id: Optional[UUID] = None) -> None:
+        """Call after committing a change to a doctor's appointments"""
+        message = {"doctor_id": str(doctor_id) if doctor_id else None}
+        self.invalidate(message)
+        await broker.publish(AVAILABILITY_CHANNEL, message)
+
+    def stats(self) -> dict:
+        return {
+            "doctors_loaded": len(self.schedules),
+            "intervals": sum(len(s.starts) for s in self.schedules.values()),
+            "loads": self.loads,
+        }
+
+
+availability_index = AvailabilityIndex()
+broker.subscribe(AVAILABILITY_CHANNEL, availability_index.invalidate)
+broker.on_resync(availability_index.invalidate)
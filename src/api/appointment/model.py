@@ -1,6 +1,6 @@
 from datetime import datetime
 import uuid
-from sqlalchemy import Column, Enum
+from sqlalchemy import Column, Enum, Index, text
 from sqlmodel import Field, Relationship, SQLModel
 from typing import TYPE_CHECKING, Optional
 from src.api.base_model import ModelBase
@@ -32,6 +32,28 @@ class AppointmentStatus(BaseEnum):
 
 
 class Appointment(ModelBase, SQLModel, table=True):
+    __table_args__ = (
+        # Open appointments only, see nurse_list_all
+        Index(
+            "ix_appointment_open_status_scheduled_time",
+            "status",
+            "scheduled_time",
+            postgresql_where=text("status <> 'COMPLETED'"),
+            sqlite_where=text("status <> 'COMPLETED'"),
+        ),
+        # Patient and doctor lookups, both listed by scheduled_time
+        Index(
+            "ix_appointment_patient_id_scheduled_time",
+            "patient_id",
+            "scheduled_time",
+        ),
+        Index(
+            "ix_appointment_doctor_id_scheduled_time",
+            "doctor_id",
+            "scheduled_time",
+        ),
+    )
+
     id: Optional[uuid.UUID] = Field(
         default_factory=uuid.uuid4,
         primary_key=True,
@@ -1,22 +1,128 @@
-from fastapi import Depends
-from sqlmodel import Session, select
-from datetime import datetime, date
-from sqlalchemy import func
+from bisect import bisect_left, insort
+from typing import List, Tuple
+from uuid import UUID
 
+from fastapi import Depends, HTTPException
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from datetime import date, datetime, time, timedelta
+
+from src.api.appointment.availability import (
+    DOCTORS_PER_QUERY,
+    availability_index,
+)
 from src.api.appointment.model import (
     Appointment,
+    AppointmentStatus,
     AppointmentType,
 )
-from src.api.user.models import Patient
-from src.core.database import get_session
-from sqlalchemy.orm import selectinload
+from src.api.appointment.schema import AvailabilityQuery
+from src.api.appointment.triage import triage_index
+from src.api.ehr.workload import workload_index
+from src.api.pagination import PageParams, page_of, paginate
+from src.api.user.directory import doctor_directory
+from src.api.user.models import Doctor, Patient
+from src.core.config import settings
+from src.core.database import get_read_session, get_session
+
+# Columns the appointment dashboards use, selected as plain rows
+APPOINTMENT_SUMMARY_COLUMNS = (
+    Appointment.id,
+    Appointment.patient_id,
+    Appointment.doctor_id,
+    Appointment.scheduled_time,
+    Appointment.duration_minutes,
+    Appointment.status,
+    Appointment.urgency_level,
+    Appointment.type,
+    Appointment.location,
+    Appointment.description,
+)
+PATIENT_SUMMARY_FIELDS = ("full_name", "age", "gender", "hospital_card_id")
+
+
+async def claim_slots(
+    session: AsyncSession, bookings: List[Tuple[UUID, UUID, datetime, int]]
+) -> List[UUID]:
+    """Lock the doctors of some bookings and find those already taken.
+
+    Each booking is (appointment_id, doctor_id, start, duration_minutes).
+    Returns the appointment ids whose doctor is booked at that time, by
+    other appointments or by an earlier booking in the list. The doctor
+    rows stay locked until the caller commits, so concurrent bookings for
+    the same doctor are checked one after the other.
+    """
+    doctor_ids = sorted({doctor_id for _, doctor_id, _, _ in bookings})
+    appointment_ids = {appointment_id for appointment_id, *_ in bookings}
+    longest = timedelta(minutes=settings.APPOINTMENT_MAX_DURATION_MINUTES)
+    first = min(start for _, _, start, _ in bookings)
+    last = max(
+        start + timedelta(minutes=duration)
+        for _, _, start, duration in bookings
+    )
+    booked = {doctor_id: [] for doctor_id in doctor_ids}
+    for start in range(0, len(doctor_ids), DOCTORS_PER_QUERY):
+        end = start + DOCTORS_PER_QUERY
+        chunk = doctor_ids[start:end]
+        # Locked in id order, so two batches cannot deadlock each other
+        statement = (
+            select(Doctor.id)
+            .where(Doctor.id.in_(chunk))
+            .order_by(Doctor.id)
+            .with_for_update()
+        )
+        if len((await session.exec(statement)).all()) < len(chunk):
+            raise HTTPException(status_code=404, detail="Doctor not found")
+        statement = select(
+            Appointment.id,
+            Appointment.doctor_id,
+            Appointment.scheduled_time,
+            Appointment.duration_minutes,
+        ).where(
+            Appointment.doctor_id.in_(chunk),
+            Appointment.status != AppointmentStatus.CANCELED,
+            Appointment.scheduled_time < last,
+            Appointment.scheduled_time > first - longest,
+        )
+        for appointment_id, doctor_id, scheduled_time, duration in (
+            await session.exec(statement)
+        ).all():
+            # A booking being moved does not conflict with where it was
+            if appointment_id not in appointment_ids:
+                booked[doctor_id].append(
+                    (scheduled_time, timedelta(minutes=duration))
+                )
+    for intervals in booked.values():
+        intervals.sort()
+
+    taken = []
+    for appointment_id, doctor_id, start, duration in bookings:
+        end = start + timedelta(minutes=duration)
+        intervals = booked[doctor_id]
+        # Only bookings that start less than `longest` earlier can reach
+        index = bisect_left(intervals, (end,))
+        while index and intervals[index - 1][0] > start - longest:
+            index -= 1
+            scheduled_time, length = intervals[index]
+            if scheduled_time + length > start:
+                taken.append(appointment_id)
+                break
+        else:
+            insort(intervals, (start, end - start))
+    return taken
 
 
 class AppointmentRepository:
-    def __init__(self, session: Session = Depends(get_session)) -> None:
+    def __init__(
+        self,
+        session: AsyncSession = Depends(get_session),
+        read_session: AsyncSession = Depends(get_read_session),
+    ) -> None:
         self.session = session
+        # Replica session for reads that do not follow a write
+        self.read_session = read_session
 
-    def create(self, patient_id, data):
+    async def create(self, patient_id, data):
         # Parse date and time
         date_str = data.appointment_date
         time_str = data.appointment_time
@@ -26,16 +132,68 @@ class AppointmentRepository:
 
         appointment = Appointment(
             patient_id=patient_id,
+            doctor_id=data.doctor_id,
             scheduled_time=scheduled_time,
             status=data.status,
             type=AppointmentType.CONSULTATION,
         )
+        if appointment.doctor_id is not None:
+            await self._claim_slot(appointment)
         self.session.add(appointment)
-        self.session.commit()
-        self.session.refresh(appointment)
+        await self.session.commit()
+        await self.session.refresh(appointment)
+        await triage_index.track(appointment)
+        if appointment.doctor_id is not None:
+            await availability_index.changed(appointment.doctor_id)
+            await workload_index.track(appointment)
         return appointment
 
-    def create_emergency(self, patient_id, data):
+    async def _claim_slot(self, appointment: Appointment) -> None:
+        """Lock the doctor and check the slot is still free.
+
+        The doctor row stays locked until the booking commits, so two
+        bookings for the same doctor are checked one after the other.
+        """
+        booking = (
+            appointment.id,
+            appointment.doctor_id,
+            appointment.scheduled_time,
+            appointment.duration_minutes,
+        )
+        if await claim_slots(self.session, [booking]):
+            raise HTTPException(
+                status_code=409,
+                detail="The doctor is already booked at that time",
+            )
+
+    async def free_slots(self, query: AvailabilityQuery):
+        if query.doctor_id is not None:
+            doctor_ids = [query.doctor_id]
+        else:
+            snapshot = await doctor_directory.snapshot(self.session)
+            doctor_ids = [
+                doctor.id
+                for doctor in snapshot.doctors
+                if doctor.status == "active"
+            ]
+        slots = await availability_index.free_slots(
+            self.session,
+            doctor_ids,
+            query.start,
+            query.end,
+            query.duration,
+            query.limit,
+        )
+        return [
+            {
+                "doctor_id": doctor_id,
+                "start": start,
+                "end": start + query.duration,
+            }
+            for start, doctor_id in slots
+        ]
+
+    async def create_emergency(self, patient_id, data):
         appointment = Appointment(
             patient_id=patient_id,
             scheduled_time=datetime.now(),
@@ -46,11 +204,16 @@ class AppointmentRepository:
             description=data.description,
         )
         self.session.add(appointment)
-        self.session.commit()
-        self.session.refresh(appointment)
+        await self.session.commit()
+        await self.session.refresh(appointment)
+        await triage_index.track(appointment)
         return appointment
 
-    def get(self, user_id, appointment_id):
+    async def triage(self, limit: int) -> bytes:
+        await triage_index.ready(self.session)
+        return triage_index.body(limit)
+
+    async def get(self, user_id, appointment_id):
         statement = select(Appointment).where(
             (Appointment.id == appointment_id)
             & (
@@ -58,57 +221,63 @@ class AppointmentRepository:
                 | (Appointment.doctor_id == user_id)
             )
         )
-        return self.session.exec(statement).one_or_none()
+        return (await self.session.exec(statement)).one_or_none()
 
-    def list(self, user_id):
-        statement = (
-            select(Appointment)
-            .where(
-                (Appointment.patient_id == user_id)
-                | (Appointment.doctor_id == user_id)
-            )
-            .options(selectinload(Appointment.patient))
+    async def list(self, user_id, page: PageParams, filters):
+        statement = self._summaries().where(
+            (Appointment.patient_id == user_id)
+            | (Appointment.doctor_id == user_id)
         )
-        appointments = self.session.exec(statement).all()
+        return await self._page_with_patient(statement, page, filters)
 
-        enriched_appointments = []
-        for appointment in appointments:
-            patient = self.session.exec(
-                select(Patient).where(Patient.id == appointment.patient_id)
-            ).one()
-            if patient:
-                new = {}
-                new["appointment"] = appointment
-                new["patient"] = patient
-                enriched_appointments.append(new)
-        return enriched_appointments
-
-    def nurse_list_all(self):
-        today = date.today()
-        statement = select(Appointment).where(
-            (func.date(Appointment.scheduled_time) == today)
+    async def nurse_list_all(self, page: PageParams, filters):
+        # Half-open ranges on the raw column keep the predicate sargable so
+        # the scheduled_time and open-queue indexes can be used
+        today_start = datetime.combine(date.today(), time.min)
+        tomorrow_start = today_start + timedelta(days=1)
+        statement = self._summaries().where(
+            (
+                (Appointment.scheduled_time >= today_start)
+                & (Appointment.scheduled_time < tomorrow_start)
+            )
             | (
-                (func.date(Appointment.scheduled_time) < today)
+                (Appointment.scheduled_time < today_start)
                 & (Appointment.status != "COMPLETED")
             )
         )
-        appointments = self.session.exec(statement).all()
+        return await self._page_with_patient(statement, page, filters)
 
+    def _summaries(self):
+        # The patient columns arrive in the same query through the join
+        return select(
+            *APPOINTMENT_SUMMARY_COLUMNS,
+            *(
+                getattr(Patient, field).label(f"patient_{field}")
+                for field in PATIENT_SUMMARY_FIELDS
+            ),
+        ).join(Patient, Appointment.patient_id == Patient.id)
+
+    async def _page_with_patient(self, statement, page, filters):
+        columns = (Appointment.scheduled_time, Appointment.id)
+        statement = paginate(filters.apply(statement), columns, page)
+        rows = (await self.read_session.exec(statement)).all()
+        rows, next_cursor = page_of(rows, columns, page)
         enriched_appointments = []
-        for appointment in appointments:
-            patient = self.session.exec(
-                select(Patient).where(Patient.id == appointment.patient_id)
-            ).one()
-            if patient:
-                new = {}
-                new["appointment"] = appointment
-                new["patient"] = patient
-                enriched_appointments.append(new)
-        return enriched_appointments
-
-    def update(self, user_id, appointment_id, data):
-        appointment = self.get(user_id, appointment_id)
+        for row in rows:
+            appointment = row._asdict()
+            patient = {"id": appointment["patient_id"]}
+            for field in PATIENT_SUMMARY_FIELDS:
+                patient[field] = appointment.pop(f"patient_{field}")
+            enriched_appointments.append(
+                {"appointment": appointment, "patient": patient}
+            )
+        return enriched_appointments, next_cursor
+
+    async def update(self, user_id, appointment_id, data):
+        appointment = await self.get(user_id, appointment_id)
         if appointment:
+            was_booked = appointment.status != AppointmentStatus.CANCELED
+            previous_time = appointment.scheduled_time
             # Update the fields
             if hasattr(data, "appointment_date") and hasattr(
                 data, "appointment_time"
@@ -122,14 +291,34 @@ class AppointmentRepository:
             if hasattr(data, "status"):
                 appointment.status = data.status
 
+            # Moving a booking, or bringing back a canceled one, takes the
+            # new slot and needs the same check as a new booking
+            if (
+                appointment.doctor_id is not None
+                and appointment.status != AppointmentStatus.CANCELED
+                and (
+                    not was_booked
+                    or appointment.scheduled_time != previous_time
+                )
+            ):
+                await self._claim_slot(appointment)
+
             self.session.add(appointment)
-            self.session.commit()
-            self.session.refresh(appointment)
+            await self.session.commit()
+            await self.session.refresh(appointment)
+            await triage_index.track(appointment)
+            if appointment.doctor_id is not None:
+                await availability_index.changed(appointment.doctor_id)
+                await workload_index.track(appointment)
         return appointment
 
-    def delete(self, user_id, appointment_id):
-        appointment = self.get(user_id, appointment_id)
+    async def delete(self, user_id, appointment_id):
+        appointment = await self.get(user_id, appointment_id)
         if appointment:
-            self.session.delete(appointment)
-            self.session.commit()
+            await self.session.delete(appointment)
+            await self.session.commit()
+            await triage_index.removed(appointment.id)
+            if appointment.doctor_id is not None:
+                await availability_index.changed(appointment.doctor_id)
+                await workload_index.assigned(appointment.id, None)
         return {"success": True}
@@ -1,8 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from src.api.appointment.service import AppointmentService
-from src.api.appointment.schema import AppointmentInput, EmergencyInput
+from src.api.appointment.schema import (
+    AppointmentFilters,
+    AppointmentInput,
+    AppointmentPage,
+    AvailabilityQuery,
+    AvailabilityResponse,
+    EmergencyInput,
+    TriageQueue,
+    appointment_page_serializer,
+    availability_serializer,
+)
 from src.api.deps import get_current_user
-from src.api.user.models import User
+from src.api.pagination import PageParams
+from src.api.principal import Principal
+from src.api.rbac import RoleCheck
+from src.api.responses import FastJSONResponse
+from src.api.user.models import UserRole
 
 router = APIRouter()
 
@@ -11,9 +25,9 @@ router = APIRouter()
 async def book_appointment(
     data: AppointmentInput,
     appointment_service: AppointmentService = Depends(),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
-    appointment = appointment_service.book_appointment(
+    appointment = await appointment_service.book_appointment(
         current_user.patient.id, data
     )
     return {"success": True, "appointment": appointment}
@@ -23,32 +37,69 @@ async def book_appointment(
 async def emergency_request(
     data: EmergencyInput,
     appointment_service: AppointmentService = Depends(),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     """Submit an emergency appointment request"""
-    appointment = appointment_service.emergency_request(
+    appointment = await appointment_service.emergency_request(
         current_user.patient.id, data
     )
     return {"success": True, "appointment": appointment}
 
 
-@router.get("/mine")
+@router.get("/availability", response_model=AvailabilityResponse)
+async def get_availability(
+    query: AvailabilityQuery = Depends(),
+    appointment_service: AppointmentService = Depends(),
+    current_user: Principal = Depends(get_current_user),
+):
+    """Next free slots of one doctor or of any active doctor"""
+    slots = await appointment_service.free_slots(query)
+    return availability_serializer.response({"slots": slots})
+
+
+@router.get(
+    "/triage",
+    response_model=TriageQueue,
+    dependencies=[Depends(RoleCheck([UserRole.nurse, UserRole.doctor]))],
+)
+async def get_triage_queue(
+    limit: int = Query(20, ge=1, le=200),
+    appointment_service: AppointmentService = Depends(),
+):
+    """Waiting appointments by urgency and waiting time, most pressing first"""
+    body = await appointment_service.triage(limit)
+    return FastJSONResponse(body)
+
+
+@router.get("/mine", response_model=AppointmentPage)
 async def list_appointments(
+    page: PageParams = Depends(),
+    filters: AppointmentFilters = Depends(),
     appointment_service: AppointmentService = Depends(),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     """List all appointments for the current user"""
-    appointments = appointment_service.list(current_user.patient.id)
-    return {"appointments": appointments}
+    appointments, next_cursor = await appointment_service.list(
+        current_user.patient.id, page, filters
+    )
+    return appointment_page_serializer.response(
+        {"appointments": appointments, "next_cursor": next_cursor}
+    )
 
 
-@router.get("/nurse/all")
+@router.get("/nurse/all", response_model=AppointmentPage)
 async def list_all_appointments(
+    page: PageParams = Depends(),
+    filters: AppointmentFilters = Depends(),
     appointment_service: AppointmentService = Depends(),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
-    appointments = appointment_service.nurse_list_all()
-    return {"appointments": appointments}
+    appointments, next_cursor = await appointment_service.nurse_list_all(
+        page, filters
+    )
+    return appointment_page_serializer.response(
+        {"appointments": appointments, "next_cursor": next_cursor}
+    )
 
 
 @router.put("/update/{appointment_id}")
@@ -56,10 +107,10 @@ async def update_appointment(
     appointment_id: int,
     data: AppointmentInput,
     appointment_service: AppointmentService = Depends(),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     """Update an appointment"""
-    appointment = appointment_service.update(
+    appointment = await appointment_service.update(
         current_user, appointment_id, data
     )
     if not appointment:
@@ -74,10 +125,10 @@ async def update_appointment(
 async def delete_appointment(
     appointment_id: int,
     appointment_service: AppointmentService = Depends(),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     """Delete an appointment"""
-    result = appointment_service.delete(current_user.id, appointment_id)
+    result = await appointment_service.delete(current_user.id, appointment_id)
     if not result.get("success"):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
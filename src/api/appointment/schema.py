@@ -1,12 +1,27 @@
+from datetime import datetime, timedelta
+from typing import List, Optional
+from uuid import UUID
+
+from fastapi import Query
 from pydantic import BaseModel
+from typing_extensions import TypedDict
 
-from src.api.appointment.model import UrgencyLevel
+from src.api.appointment.model import (
+    Appointment,
+    AppointmentStatus,
+    AppointmentType,
+    UrgencyLevel,
+)
+from src.api.responses import Serializer
+from src.api.user.models import GenderEnum
 
 
 class AppointmentInput(BaseModel):
     appointment_date: str
     appointment_time: str
     status: str = "PENDING"
+    # Booking a given doctor checks the slot is still free
+    doctor_id: Optional[UUID] = None
 
 
 class EmergencyInput(BaseModel):
@@ -14,3 +29,102 @@ class EmergencyInput(BaseModel):
     description: str
     location: str
     urgency_level: UrgencyLevel
+
+
+class AppointmentFilters:
+    """Query filters applied in SQL by the appointment list endpoints"""
+
+    def __init__(
+        self,
+        status: Optional[AppointmentStatus] = Query(None),
+        type: Optional[AppointmentType] = Query(None),
+        scheduled_from: Optional[datetime] = Query(None),
+        scheduled_to: Optional[datetime] = Query(None),
+    ) -> None:
+        self.status = status
+        self.type = type
+        self.scheduled_from = scheduled_from
+        self.scheduled_to = scheduled_to
+
+    def apply(self, statement):
+        if self.status is not None:
+            statement = statement.where(Appointment.status == self.status)
+        if self.type is not None:
+            statement = statement.where(Appointment.type == self.type)
+        if self.scheduled_from is not None:
+            statement = statement.where(
+                Appointment.scheduled_time >= self.scheduled_from
+            )
+        if self.scheduled_to is not None:
+            statement = statement.where(
+                Appointment.scheduled_time < self.scheduled_to
+            )
+        return statement
+
+
+class AvailabilityQuery:
+    """Query parameters of the free slot search"""
+
+    def __init__(
+        self,
+        start: Optional[datetime] = Query(None),
+        end: Optional[datetime] = Query(None),
+        duration_minutes: int = Query(20, ge=5, le=240),
+        limit: int = Query(10, ge=1, le=100),
+        doctor_id: Optional[UUID] = Query(None),
+    ) -> None:
+        now = datetime.now()
+        self.start = max(start, now) if start else now
+        self.end = end or self.start + timedelta(days=7)
+        self.duration = timedelta(minutes=duration_minutes)
+        self.limit = limit
+        self.doctor_id = doctor_id
+
+
+class FreeSlot(TypedDict):
+    doctor_id: UUID
+    start: datetime
+    end: datetime
+
+
+class AvailabilityResponse(TypedDict):
+    slots: List[FreeSlot]
+
+
+class AppointmentSummary(TypedDict):
+    id: UUID
+    patient_id: UUID
+    doctor_id: Optional[UUID]
+    scheduled_time: datetime
+    duration_minutes: int
+    status: AppointmentStatus
+    urgency_level: UrgencyLevel
+    type: AppointmentType
+    location: Optional[str]
+    description: Optional[str]
+
+
+class PatientSummary(TypedDict):
+    id: UUID
+    full_name: str
+    age: int
+    gender: GenderEnum
+    hospital_card_id: str
+
+
+class AppointmentRow(TypedDict):
+    appointment: AppointmentSummary
+    patient: PatientSummary
+
+
+class AppointmentPage(TypedDict):
+    appointments: List[AppointmentRow]
+    next_cursor: Optional[str]
+
+
+class TriageQueue(TypedDict):
+    queue: List[AppointmentSummary]
+
+
+appointment_page_serializer = Serializer(AppointmentPage)
+availability_serializer = Serializer(AvailabilityResponse)
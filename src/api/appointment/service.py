@@ -10,10 +10,10 @@ class AppointmentService:
         self.repository = repository
         self.sse_service = SSEService()
 
-    def book_appointment(self, user_id, data):
-        appointment = self.repository.create(user_id, data)
+    async def book_appointment(self, user_id, data):
+        appointment = await self.repository.create(user_id, data)
         # Send SSE notification
-        self.sse_service.send_notification(
+        await self.sse_service.send_notification(
             {
                 "type": "appointment_booked",
                 "patient_id": user_id,
@@ -23,10 +23,10 @@ class AppointmentService:
         )
         return appointment
 
-    def emergency_request(self, user_id, data):
-        appointment = self.repository.create_emergency(user_id, data)
+    async def emergency_request(self, user_id, data):
+        appointment = await self.repository.create_emergency(user_id, data)
         # Send SSE notification with high priority
-        self.sse_service.send_notification(
+        await self.sse_service.send_notification(
             {
                 "type": "emergency_request",
                 "urgency": appointment.urgency_level.value,
@@ -39,14 +39,20 @@ class AppointmentService:
         )
         return appointment
 
-    def list(self, user_id):
-        return self.repository.list(user_id)
+    async def free_slots(self, query):
+        return await self.repository.free_slots(query)
 
-    def nurse_list_all(self):
-        return self.repository.nurse_list_all()
+    async def triage(self, limit: int) -> bytes:
+        return await self.repository.triage(limit)
 
-    def update(self, user_id, appointment_id, data):
-        return self.repository.update(user_id, appointment_id, data)
+    async def list(self, user_id, page, filters):
+        return await self.repository.list(user_id, page, filters)
 
-    def delete(self, user_id, appointment_id):
-        return self.repository.delete(user_id, appointment_id)
+    async def nurse_list_all(self, page, filters):
+        return await self.repository.nurse_list_all(page, filters)
+
+    async def update(self, user_id, appointment_id, data):
+        return await self.repository.update(user_id, appointment_id, data)
+
+    async def delete(self, user_id, appointment_id):
+        return await self.repository.delete(user_id, appointment_id)
@@ -0,0 +1,228 @@
+import heapq
+import json
+import time
+from bisect import bisect_left, insort
+from datetime import datetime
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.api.appointment.model import Appointment, AppointmentStatus
+from src.api.appointment.schema import AppointmentSummary
+from src.api.ehr.workload import urgency_weight
+from src.api.responses import Serializer
+from src.core.broker import broker
+from src.core.config import settings
+from src.core.serialization import dumps
+from src.core.synced import SyncedIndex
+
+TRIAGE_CHANNEL = "triage_queue"
+OPEN_STATUSES = (AppointmentStatus.PENDING, AppointmentStatus.VITALS_RECORDED)
+SUMMARY_FIELDS = tuple(AppointmentSummary.__annotations__)
+# NOTIFY payloads are limited to 8000 bytes
+IDS_PER_MESSAGE = 100
+# Free text is cut short in the queue to keep summaries under that limit,
+# the appointment itself still has all of it
+TEXT_FIELDS = ("location", "description")
+TEXT_PREVIEW_CHARS = 200
+
+summary_serializer = Serializer(AppointmentSummary)
+
+
+def preview(text: Optional[str]) -> Optional[str]:
+    if text is None or len(text) <= TEXT_PREVIEW_CHARS:
+        return text
+    end = TEXT_PREVIEW_CHARS - 1
+    return text[:end] + "\u2026"
+
+
+def priority_key(scheduled_time: datetime, urgency) -> float:
+    """Sort key of a waiting appointment, lower is seen first"""
+    # Each urgency level counts as TRIAGE_AGING_MINUTES of extra waiting,
+    # so nobody waits forever and the key never changes with time
+    aging = settings.TRIAGE_AGING_MINUTES * 60
+    return scheduled_time.timestamp() - urgency_weight(urgency) * aging
+
+
+class TriageIndex(SyncedIndex):
+    """Open appointments in triage order, kept in memory per worker"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        # (key, scheduled timestamp, appointment id) of due ones, sorted
+        self.order: List[Tuple[float, float, str]] = []
+        # (scheduled timestamp, key, appointment id) of those booked for
+        # later, they join the order when they come due
+        self.future: List[Tuple[float, float, str]] = []
+        # appointment id -> (its order entry, summary, encoded summary),
+        # reading the top of the queue only joins bytes already there
+        self.entries: Dict[str, Tuple[tuple, dict, bytes]] = {}
+
+    @property
+    def resync_seconds(self) -> float:
+        return settings.TRIAGE_RESYNC_SECONDS
+
+    async def _query(self, session: AsyncSession) -> list:
+        statement = select(
+            *(getattr(Appointment, field) for field in SUMMARY_FIELDS)
+        ).where(Appointment.status.in_(OPEN_STATUSES))
+        return (await session.exec(statement)).all()
+
+    def _seed(self, rows: list) -> None:
+        self.entries = {}
+        for row in rows:
+            entry = self._entry(self._message(row._asdict()))
+            self.entries[entry[0][2]] = entry
+        self._rebuild()
+
+    def _message(self, summary: dict) -> dict:
+        summary = {
+            **summary,
+            **{field: preview(summary[field]) for field in TEXT_FIELDS},
+        }
+        return {
+            "appointment_id": str(summary["id"]),
+            "key": priority_key(
+                summary["scheduled_time"], summary["urgency_level"]
+            ),
+            "scheduled": summary["scheduled_time"].timestamp(),
+            "summary": summary_serializer.dump(summary).decode(),
+        }
+
+    def _entry(self, message: dict) -> Tuple[tuple, dict, bytes]:
+        item = (
+            message["key"],
+            message["scheduled"],
+            message["appointment_id"],
+        )
+        body = message["summary"].encode()
+        return item, json.loads(body), body
+
+    def _rebuild(self) -> None:
+        now = time.time()
+        items = [item for item, _, _ in self.entries.values()]
+        self.order = sorted(item for item in items if item[1] <= now)
+        self.future = [
+            (scheduled, key, appointment_id)
+            for key, scheduled, appointment_id in items
+            if scheduled > now
+        ]
+        heapq.heapify(self.future)
+
+    def _queued(self, item: tuple) -> int:
+        """Position of an item in the due queue, -1 when not in it"""
+        index = bisect_left(self.order, item)
+        if index < len(self.order) and self.order[index] == item:
+            return index
+        return -1
+
+    def _insert(self, item: tuple) -> None:
+        key, scheduled, appointment_id = item
+        if scheduled <= time.time():
+            insort(self.order, item)
+            return
+        heapq.heappush(self.future, (scheduled, key, appointment_id))
+        if self.outgrown(self.future, len(self.entries)):
+            self._rebuild()
+
+    def _promote(self, now: float) -> None:
+        """Move appointments that came due from the heap to the queue"""
+        future = self.future
+        while future and future[0][0] <= now:
+            scheduled, key, appointment_id = heapq.heappop(future)
+            item = (key, scheduled, appointment_id)
+            entry = self.entries.get(appointment_id)
+            # Skip outdated entries and copies of one already queued
+            if entry is not None and entry[0] == item:
+                if self._queued(item) < 0:
+                    insort(self.order, item)
+
+    def _remove(self, appointment_id: str) -> None:
+        entry = self.entries.pop(appointment_id, None)
+        if entry is not None:
+            # Not queued yet, its heap entry is outdated from now on
+            index = self._queued(entry[0])
+            if index >= 0:
+                del self.order[index]
+
+    def _apply(self, message: dict) -> None:
+        """Sets, patches or removes appointments"""
+        if "changes" in message:
+            self._patch(message["appointment_ids"], message["changes"])
+            return
+        appointment_id = message["appointment_id"]
+        self._remove(appointment_id)
+        if message.get("summary") is not None:
+            entry = self._entry(message)
+            self.entries[appointment_id] = entry
+            self._insert(entry[0])
+
+    def _patch(self, appointment_ids: List[str], changes: dict) -> None:
+        for appointment_id in appointment_ids:
+            entry = self.entries.get(appointment_id)
+            if entry is None:
+                continue
+            item, summary, _ = entry
+            summary.update(changes)
+            self.entries[appointment_id] = (item, summary, dumps(summary))
+
+    def top(self, limit: int) -> List[bytes]:
+        """The first `limit` appointments that are due.
+
+        O(limit) plus the appointments that came due since the last call.
+        """
+        self._promote(time.time())
+        return [
+            self.entries[appointment_id][2]
+            for _, _, appointment_id in islice(self.order, limit)
+        ]
+
+    def body(self, limit: int) -> bytes:
+        return b'{"queue":[' + b",".join(self.top(limit)) + b"]}"
+
+    async def track(self, appointment: Appointment) -> None:
+        """Call after committing a new or changed appointment"""
+        if appointment.status not in OPEN_STATUSES:
+            await self.removed(appointment.id)
+            return
+        summary = {
+            field: getattr(appointment, field) for field in SUMMARY_FIELDS
+        }
+        await self._publish(self._message(summary))
+
+    async def removed(self, appointment_id: UUID) -> None:
+        """Call after committing a change that takes it off the queue"""
+        await self._publish({"appointment_id": str(appointment_id)})
+
+    async def changed(self, appointment_ids: Iterable[UUID], **changes):
+        """Call after committing a field change on queued appointments"""
+        changes = json.loads(dumps(changes))
+        appointment_ids = [str(i) for i in appointment_ids]
+        for start in range(0, len(appointment_ids), IDS_PER_MESSAGE):
+            end = start + IDS_PER_MESSAGE
+            await self._publish(
+                {
+                    "appointment_ids": appointment_ids[start:end],
+                    "changes": changes,
+                }
+            )
+
+    async def _publish(self, message: dict) -> None:
+        self.apply(message)
+        await broker.publish(TRIAGE_CHANNEL, message)
+
+    def stats(self) -> dict:
+        return {
+            "queued": len(self.order),
+            "scheduled": len(self.entries) - len(self.order),
+            "loaded": self.loaded_at is not None,
+            "loads": self.reloads,
+        }
+
+
+triage_index = TriageIndex()
+broker.subscribe(TRIAGE_CHANNEL, triage_index.apply)
+broker.on_resync(triage_index.invalidate)
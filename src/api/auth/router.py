@@ -14,13 +14,16 @@ from src.api.auth.schemas import (
 from src.api.auth.service import AuthService
 from src import api
 from src.api.deps import get_current_user
-from src.api.user.models import User, UserRole
+from src.api.principal import Principal
+from src.api.user.models import UserRole
 
 router = APIRouter()
 
 
 @router.post("/register", response_model=UserResponse)
-def register(input: RegisterInput, auth_service: AuthService = Depends()):
+async def register(
+    input: RegisterInput, auth_service: AuthService = Depends()
+):
     kwargs = {}
 
     kwargs["age"] = input.age
@@ -29,7 +32,7 @@ def register(input: RegisterInput, auth_service: AuthService = Depends()):
     kwargs["height"] = input.height
     kwargs["hospital_card_id"] = input.hospital_card_id
 
-    user = auth_service.register(
+    user = await auth_service.register(
         input.full_name,
         input.email,
         input.password,
@@ -42,11 +45,13 @@ def register(input: RegisterInput, auth_service: AuthService = Depends()):
 
 
 @router.post("/login", response_model=AuthResponse)
-def login(
+async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
     auth_service: AuthService = Depends(),
 ):
-    user, token = auth_service.login(form_data.username, form_data.password)
+    user, token = await auth_service.login(
+        form_data.username, form_data.password
+    )
 
     user_response = UserResponse(
         id=user.id, username=user.username, email=user.email, role=user.role
@@ -54,7 +59,8 @@ def login(
 
     # Create the appropriate entity response based on user's role
     if user.role == UserRole.doctor and user.doctor:
-        auth_service.set_doctor_as_active(user.id)
+        if user.doctor.status != "active":
+            await auth_service.set_doctor_as_active(user.id)
         user_response.doctor = DoctorResponse(
             id=user.doctor.id, full_name=user.doctor.full_name
         )
@@ -77,12 +83,12 @@ def login(
 
 
 @router.post("/forgot-password")
-def forgot_password(
+async def forgot_password(
     input: ForgotPasswordInput,
     background_tasks: BackgroundTasks,
     auth_service: AuthService = Depends(),
 ):
-    otp = auth_service.forgot_password(input.email)
+    otp = await auth_service.forgot_password(input.email)
     my_email = api.EmailSchema(
         subject="Forgot Password",
         email=[input.email],
@@ -93,18 +99,18 @@ def forgot_password(
 
 
 @router.post("/confirm-otp")
-def confirm_otp(
+async def confirm_otp(
     input: ConfirmOtpInput, auth_service: AuthService = Depends()
 ):
-    token = auth_service.confirm_otp(input.email, input.otp)
+    token = await auth_service.confirm_otp(input.email, input.otp)
     return {"detail": "OTP confirmed", token: token}
 
 
 @router.post("/reset-password")
-def reset_password(
+async def reset_password(
     input: ResetPasswordInput,
     auth_service: AuthService = Depends(),
-    user: User = Depends(get_current_user),
+    user: Principal = Depends(get_current_user),
 ):
-    auth_service.reset_password(input.email, input.new_password)
+    await auth_service.reset_password(input.email, input.new_password)
     return {"detail": "Password reset successfully"}
@@ -1,11 +1,17 @@
 import jwt
 import random
+import time
 from datetime import datetime, timedelta
 from typing import Optional
 from fastapi import Depends, HTTPException
-from sqlmodel import Session, select
-from passlib.context import CryptContext
+from sqlalchemy import update
+from sqlalchemy.orm import joinedload
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from src.core.database import get_session
+from src.api.auth.hashing import password_hasher
+from src.api.principal import principal_cache
+from src.api.user.directory import doctor_directory
 from src.api.user.models import (
     Doctor,
     GenderEnum,
@@ -17,20 +23,17 @@ from src.api.user.models import (
 from src import settings
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-
 class AuthService:
-    def __init__(self, session: Session = Depends(get_session)) -> None:
+    def __init__(self, session: AsyncSession = Depends(get_session)) -> None:
         self.session = session
 
-    def hash_password(self, password: str) -> str:
-        return pwd_context.hash(password)
+    async def hash_password(self, password: str) -> str:
+        return await password_hasher.hash(password)
 
-    def verify_password(
+    async def verify_password(
         self, plain_password: str, hashed_password: str
     ) -> bool:
-        return pwd_context.verify(plain_password, hashed_password)
+        return await password_hasher.verify(plain_password, hashed_password)
 
     def create_access_token(
         self, data: dict, expires_delta: Optional[timedelta] = None
@@ -40,12 +43,14 @@ class AuthService:
             expires_delta
             or timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
         )
-        to_encode.update({"exp": expire})
+        # A fractional iat, a token issued in the same second as a password
+        # reset is still told apart from it
+        to_encode.update({"exp": expire, "iat": time.time()})
         return jwt.encode(
             to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM
         )
 
-    def register(
+    async def register(
         self,
         full_name: str,
         email: str,
@@ -58,8 +63,12 @@ class AuthService:
             statement_id = select(User).where(
                 User.username == identification_number
             )
-            existing_email = self.session.exec(statement_email).one_or_none()
-            existing_id = self.session.exec(statement_id).one_or_none()
+            existing_email = (
+                await self.session.exec(statement_email)
+            ).one_or_none()
+            existing_id = (
+                await self.session.exec(statement_id)
+            ).one_or_none()
             if existing_email or existing_id:
                 raise HTTPException(
                     status_code=400, detail="Email or id already registered"
@@ -79,12 +88,12 @@ class AuthService:
             user = User(
                 username=identification_number,
                 email=email,
-                hash=self.hash_password(password),
+                hash=await self.hash_password(password),
                 role=role,
             )
             self.session.add(user)
-            self.session.commit()
-            self.session.refresh(user)
+            await self.session.commit()
+            await self.session.refresh(user)
 
             # Create the appropriate role model based on the determined role
             if role == UserRole.doctor:
@@ -113,62 +122,65 @@ class AuthService:
                 )
                 self.session.add(patient)
 
-            self.session.commit()
+            await self.session.commit()
+            if role == UserRole.doctor:
+                await doctor_directory.changed()
             return user
+        except HTTPException:
+            # Keeps the 400 above and a busy hasher's 503 and Retry-After
+            await self.session.rollback()
+            raise
         except Exception as e:
-            self.session.rollback()
+            await self.session.rollback()
             raise HTTPException(
                 status_code=500,
                 detail=f"An error occurred during registration: {str(e)}",
             )
 
-    def login(self, email: str, password: str) -> tuple:
-        statement = select(User).where(User.email == email.lower())
-        user = self.session.exec(statement).one_or_none()
-        if not user or not self.verify_password(password, user.hash):
+    async def login(self, email: str, password: str) -> tuple:
+        # The role entity comes back in the same statement as the user
+        statement = (
+            select(User)
+            .where(User.email == email.lower())
+            .options(
+                joinedload(User.doctor),
+                joinedload(User.nurse),
+                joinedload(User.patient),
+            )
+        )
+        user = (await self.session.exec(statement)).one_or_none()
+        if not user or not await self.verify_password(password, user.hash):
             raise HTTPException(status_code=401, detail="Invalid credentials")
         token = self.create_access_token({"sub": str(user.id)})
-
-        # Load the associated entity based on the user's role
-        if user.role == UserRole.doctor:
-            statement = select(Doctor).where(Doctor.user_id == user.id)
-            doctor = self.session.exec(statement).one()
-            user.doctor = doctor
-        elif user.role == UserRole.nurse:
-            statement = select(Nurse).where(Nurse.user_id == user.id)
-            nurse = self.session.exec(statement).one()
-            user.nurse = nurse
-        elif user.role == UserRole.patient:
-            statement = select(Patient).where(Patient.user_id == user.id)
-            patient = self.session.exec(statement).one()
-            user.patient = patient
-
         return user, token
 
-    def set_doctor_as_active(self, user_id: str) -> None:
-        statement = select(Doctor).where(Doctor.user_id == user_id)
-        doctor = self.session.exec(statement).one_or_none()
-        if not doctor:
+    async def set_doctor_as_active(self, user_id: str) -> None:
+        statement = (
+            update(Doctor)
+            .where(Doctor.user_id == user_id)
+            .values(status="active")
+        )
+        result = await self.session.exec(statement)
+        if result.rowcount == 0:
             raise HTTPException(status_code=404, detail="Doctor not found")
-        doctor.status = "active"
-        self.session.add(doctor)
-        self.session.commit()
+        await self.session.commit()
+        await doctor_directory.changed()
 
-    def forgot_password(self, email: str) -> str:
+    async def forgot_password(self, email: str) -> str:
         statement = select(User).where(User.email == email)
-        user = self.session.exec(statement).one_or_none()
+        user = (await self.session.exec(statement)).one_or_none()
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         otp = f"{random.randint(100000, 999999)}"
         user.otp = otp
         user.otp_expiry = datetime.utcnow() + timedelta(minutes=10)
         self.session.add(user)
-        self.session.commit()
+        await self.session.commit()
         return otp
 
-    def confirm_otp(self, email: str, otp: str) -> bool:
+    async def confirm_otp(self, email: str, otp: str) -> bool:
         statement = select(User).where(User.email == email)
-        user = self.session.exec(statement).one_or_none()
+        user = (await self.session.exec(statement)).one_or_none()
         if (
             not user
             or user.otp != otp
@@ -180,14 +192,20 @@ class AuthService:
         token = self.create_access_token({"sub": str(user.id)})
         return token
 
-    def reset_password(self, email: str, otp: str, new_password: str) -> User:
+    async def reset_password(
+        self, email: str, otp: str, new_password: str
+    ) -> User:
         statement = select(User).where(User.email == email)
-        user = self.session.exec(statement).one_or_none()
-        user.hash = self.hash_password(new_password)
+        user = (await self.session.exec(statement)).one_or_none()
+        user.hash = await self.hash_password(new_password)
+        user.password_changed_at = datetime.utcnow()
         # Clear OTP fields
         user.otp = None
         user.otp_expiry = None
         self.session.add(user)
-        self.session.commit()
-        self.session.refresh(user)
+        await self.session.commit()
+        await self.session.refresh(user)
+        # Tokens issued before the reset are refused from now on, see
+        # get_current_user, cached principals included
+        await principal_cache.user_changed(user.id)
         return user
@@ -1,9 +1,13 @@
 from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
 import jwt
+import time
+from datetime import timezone
 from pydantic import ValidationError
-from sqlmodel import Session
+from sqlalchemy.orm import selectinload
+from sqlmodel.ext.asyncio.session import AsyncSession
 from src.api.base_model import TokenPayload
+from src.api.principal import Principal, principal_cache
 from src.api.user.models import User
 from src.core.config import settings
 
@@ -12,10 +16,10 @@ from src.core.database import get_session
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
-def get_current_user(
-    session: Session = Depends(get_session),
+async def get_current_user(
+    session: AsyncSession = Depends(get_session),
     token: str = Depends(oauth2_scheme),
-) -> User:
+) -> Principal:
     try:
         payload = jwt.decode(
             token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
@@ -27,7 +31,33 @@ def get_current_user(
             detail="Could not validate credentials",
         )
 
-    user = session.get(User, token_data.sub)
+    key = (token_data.sub, token)
+    principal = principal_cache.get(key)
+    if principal is not None:
+        return principal
+
+    user = await session.get(
+        User,
+        token_data.sub,
+        options=[
+            selectinload(User.doctor),
+            selectinload(User.nurse),
+            selectinload(User.patient),
+        ],
+    )
     if not user:
         raise HTTPException(status_code=401, detail="Account not found")
-    return user
+    # Tokens issued before the last password reset are revoked
+    if user.password_changed_at is not None:
+        changed = user.password_changed_at.replace(tzinfo=timezone.utc)
+        if payload.get("iat", 0) < changed.timestamp():
+            raise HTTPException(
+                status_code=401,
+                detail="Password changed, please log in again",
+            )
+
+    principal = Principal.from_user(user)
+    # Never keep a principal around for longer than its token is valid
+    ttl = payload["exp"] - time.time() if "exp" in payload else None
+    principal_cache.set(key, principal, ttl=ttl)
+    return principal
@@ -1,5 +1,6 @@
 from typing import TYPE_CHECKING, Optional
 from uuid import UUID
+from sqlalchemy import Index
 from sqlmodel import Field, Relationship, SQLModel
 
 from src.api.base_model import ModelBase
@@ -16,11 +17,19 @@ if TYPE_CHECKING:
 
 
 class EHR(ModelBase, SQLModel, table=True):
+    __table_args__ = (
+        # Doctor records are paged by id, see get_doctor_records
+        Index("ix_ehr_doctor_id_id", "doctor_id", "id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    patient_id: UUID = Field(foreign_key="patient.id")
+    patient_id: UUID = Field(foreign_key="patient.id", index=True)
     doctor_id: Optional[UUID] = Field(foreign_key="doctor.id", nullable=True)
     nurse_id: Optional[UUID] = Field(foreign_key="nurse.id", nullable=True)
-    appointment_id: UUID = Field(foreign_key="appointment.id")
+    # One EHR per appointment
+    appointment_id: UUID = Field(
+        foreign_key="appointment.id", unique=True, index=True
+    )
 
     # Vital signs recorded by nurse
     temperature: Optional[float] = None  # in Celsius
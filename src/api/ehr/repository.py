@@ -1,152 +1,521 @@
-from fastapi import Depends
-from sqlmodel import Session, select
+from fastapi import Depends, HTTPException
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
+from sqlalchemy import case, func, update
 from sqlalchemy.orm import selectinload
-from typing import Optional, List
+from typing import Dict, Optional, List, Set, Tuple
 from uuid import UUID
 
 from src.api.ehr.model import EHR
-from src.api.appointment.model import Appointment
-from src.api.user.models import Patient
-from src.core.database import get_session
+from src.api.ehr.schema import VitalsBatchError, VitalsRecord
+from src.api.ehr.workload import CLOSED_STATUSES, workload_index
+from src.api.appointment.availability import availability_index
+from src.api.appointment.repository import claim_slots
+from src.api.appointment.triage import triage_index
+from src.api.appointment.model import (
+    Appointment,
+    AppointmentStatus,
+    AppointmentType,
+    UrgencyLevel,
+)
+from src.api.user.directory import doctor_directory
+from src.api.user.models import Patient, User
+from src.api.pagination import PageParams, page_of, paginate
+from src.core.database import get_read_session, get_session, upsert
+
+VITALS_FIELDS = ("nurse_id", "temperature", "blood_pressure", "heart_rate")
+# Keeps every statement under the 32767 bind parameter limit of asyncpg
+ROWS_PER_STATEMENT = 4000
+# The enum is stored by name, which does not sort by urgency
+URGENCY_ORDER = case(
+    *(
+        (Appointment.urgency_level == level, int(level.value))
+        for level in UrgencyLevel
+    )
+)
+
+
+def chunked(items: list, size: int = ROWS_PER_STATEMENT):
+    for start in range(0, len(items), size):
+        end = start + size
+        yield items[start:end]
 
 
 class EHRRepository:
-    def __init__(self, session: Session = Depends(get_session)) -> None:
+    def __init__(
+        self,
+        session: AsyncSession = Depends(get_session),
+        read_session: AsyncSession = Depends(get_read_session),
+    ) -> None:
         self.session = session
+        # Replica session for reads that do not follow a write
+        self.read_session = read_session
+
+    async def assign_doctor(
+        self, doctor_id: UUID, appointment_id: UUID
+    ) -> Optional[EHR]:
+        """Assign a doctor to an appointment and its EHR record"""
+        urgency = await self._open_urgency(appointment_id)
+        if urgency is None:
+            return None
+        return await self._assign(doctor_id, appointment_id, urgency)
 
-    def assign_doctor(self, doctor_id: UUID, appointment_id: UUID) -> EHR:
-        """Create a new EHR record for an appointment"""
+    async def auto_assign(self, appointment_id: UUID) -> Optional[EHR]:
+        """Assign the least loaded active doctor free at that time.
 
-        statement = select(EHR).where(EHR.appointment_id == appointment_id)
-        ehr = self.session.exec(statement).one_or_none()
-        statement = select(Appointment).where(
+        An appointment booked with a doctor keeps them.
+        """
+        urgency = await self._open_urgency(appointment_id)
+        if urgency is None:
+            return None
+        statement = select(Appointment.doctor_id).where(
             Appointment.id == appointment_id
         )
-        appointment = self.session.exec(statement).one_or_none()
+        booked = (await self.session.exec(statement)).one_or_none()
+        if booked is not None:
+            return await self._assign(booked, appointment_id, urgency)
+        await workload_index.ready(self.session)
+        excluded = set()
+        while True:
+            doctor_id = workload_index.least_loaded(excluded)
+            if doctor_id is None:
+                raise HTTPException(
+                    status_code=409, detail="No active doctor is available"
+                )
+            if not await self._claim_slots({appointment_id: doctor_id}):
+                break
+            excluded.add(doctor_id)
+        return await self._write_assignment(
+            doctor_id, appointment_id, urgency
+        )
 
-        if not ehr or not appointment:
-            raise ValueError("EHR or Appointment not found")
-        ehr.doctor_id = doctor_id
-        appointment.doctor_id = doctor_id
-        self.session.add(ehr)
-        self.session.add(appointment)
-        self.session.commit()
-        self.session.refresh(ehr)
+    async def auto_assign_backlog(
+        self, limit: int
+    ) -> List[Tuple[UUID, UUID, UUID]]:
+        """Assign every unassigned EHR, most urgent first, in one commit.
+
+        Returns the (appointment_id, patient_id, doctor_id) of each EHR
+        assigned, up to `limit` of them. Appointments booked with a doctor
+        are not part of the backlog.
+        """
+        statement = (
+            select(EHR.appointment_id, Appointment.urgency_level)
+            .join(Appointment, EHR.appointment_id == Appointment.id)
+            .where(
+                EHR.doctor_id.is_(None),
+                EHR.status != "completed",
+                Appointment.doctor_id.is_(None),
+                Appointment.status.not_in(CLOSED_STATUSES),
+            )
+            .order_by(URGENCY_ORDER.desc(), Appointment.scheduled_time)
+            .limit(limit)
+        )
+        backlog = (await self.session.exec(statement)).all()
+        if not backlog:
+            return []
+        await workload_index.ready(self.session)
+        urgency_of = dict(backlog)
+
+        assigned = []
+        planned = 0
+        excluded: Dict[UUID, Set[UUID]] = {}
+        try:
+            plan = workload_index.plan(backlog)
+            while plan:
+                # Busy at that time, planned again without that doctor
+                taken = await self._claim_slots(plan)
+                for appointment_id in taken:
+                    doctor_id = plan.pop(appointment_id)
+                    excluded.setdefault(appointment_id, set()).add(doctor_id)
+                    workload_index.apply({"appointment_id": appointment_id})
+                planned += len(plan)
+                # Written before planning again, so the next slot check
+                # sees these bookings
+                assigned += await self._write_plan(plan)
+                plan = workload_index.plan(
+                    [(a, urgency_of[a]) for a in taken], excluded
+                )
+            await self.session.commit()
+        except BaseException:
+            workload_index.invalidate()
+            raise
+        if len(assigned) < planned:
+            workload_index.invalidate()
+        # RETURNING comes in table order, report them in backlog order
+        position = {
+            appointment_id: i for i, (appointment_id, _) in enumerate(backlog)
+        }
+        assigned.sort(key=lambda row: position[row[0]])
+
+        for appointment_id, _, doctor_id in assigned:
+            await workload_index.assigned(
+                appointment_id, doctor_id, urgency_of[appointment_id]
+            )
+        by_doctor = {}
+        for appointment_id, _, doctor_id in assigned:
+            by_doctor.setdefault(doctor_id, []).append(appointment_id)
+        for doctor_id, appointment_ids in by_doctor.items():
+            await availability_index.changed(doctor_id)
+            await triage_index.changed(appointment_ids, doctor_id=doctor_id)
+        return assigned
+
+    async def _write_plan(
+        self, plan: Dict[UUID, UUID]
+    ) -> List[Tuple[UUID, UUID, UUID]]:
+        """Assign the planned doctors, without committing"""
+        assigned = []
+        for chunk in chunked(list(plan)):
+            doctor_for = {
+                appointment_id: plan[appointment_id]
+                for appointment_id in chunk
+            }
+            # The guard skips any assigned by hand in the meantime
+            statement = (
+                update(EHR)
+                .where(
+                    EHR.appointment_id.in_(chunk),
+                    EHR.doctor_id.is_(None),
+                    EHR.status != "completed",
+                )
+                .values(doctor_id=case(doctor_for, value=EHR.appointment_id))
+                .returning(EHR.appointment_id, EHR.patient_id, EHR.doctor_id)
+            )
+            rows = (await self.session.exec(statement)).all()
+            if not rows:
+                continue
+            statement = (
+                update(Appointment)
+                .where(Appointment.id.in_([row[0] for row in rows]))
+                .values(doctor_id=case(doctor_for, value=Appointment.id))
+            )
+            await self.session.exec(statement)
+            assigned += rows
+        return assigned
+
+    async def doctor_user_id(self, doctor_id: UUID) -> Optional[UUID]:
+        """The user id of a doctor, from the cached directory"""
+        snapshot = await doctor_directory.snapshot(self.session)
+        return snapshot.user_ids.get(doctor_id)
+
+    async def _open_urgency(
+        self, appointment_id: UUID
+    ) -> Optional[UrgencyLevel]:
+        """Urgency of an appointment whose EHR is still open"""
+        statement = (
+            select(Appointment.urgency_level)
+            .join(EHR, EHR.appointment_id == Appointment.id)
+            .where(
+                Appointment.id == appointment_id,
+                EHR.status != "completed",
+            )
+        )
+        return (await self.session.exec(statement)).one_or_none()
+
+    async def _claim_slots(self, plan: Dict[UUID, UUID]) -> List[UUID]:
+        """Appointments of a plan whose doctor is booked at that time.
+
+        Only scheduled bookings hold a slot. Emergencies and walk-ins are
+        seen as they come, a doctor can take several at once.
+        """
+        bookings = []
+        for chunk in chunked(list(plan)):
+            statement = select(
+                Appointment.id,
+                Appointment.scheduled_time,
+                Appointment.duration_minutes,
+            ).where(
+                Appointment.id.in_(chunk),
+                Appointment.status != AppointmentStatus.CANCELED,
+                Appointment.type != AppointmentType.EMERGENCY,
+            )
+            bookings += [
+                (appointment_id, plan[appointment_id], start, duration)
+                for appointment_id, start, duration in (
+                    await self.session.exec(statement)
+                ).all()
+            ]
+        if not bookings:
+            return []
+        # Checked in plan order, the most urgent keep their doctor
+        position = {
+            appointment_id: i for i, appointment_id in enumerate(plan)
+        }
+        bookings.sort(key=lambda booking: position[booking[0]])
+        return await claim_slots(self.session, bookings)
+
+    async def _assign(
+        self, doctor_id: UUID, appointment_id: UUID, urgency: UrgencyLevel
+    ) -> Optional[EHR]:
+        if await self._claim_slots({appointment_id: doctor_id}):
+            raise HTTPException(
+                status_code=409,
+                detail="The doctor is already booked at that time",
+            )
+        return await self._write_assignment(
+            doctor_id, appointment_id, urgency
+        )
+
+    async def _write_assignment(
+        self, doctor_id: UUID, appointment_id: UUID, urgency: UrgencyLevel
+    ) -> Optional[EHR]:
+        ehr = await self._transition(
+            appointment_id,
+            guard=[EHR.status != "completed"],
+            values={"doctor_id": doctor_id},
+            appointment_values={"doctor_id": doctor_id},
+        )
+        if ehr:
+            await workload_index.assigned(appointment_id, doctor_id, urgency)
+            await triage_index.changed([appointment_id], doctor_id=doctor_id)
+            # A doctor being replaced keeps a stale busy slot until their
+            # schedule is next reloaded, which only hides a free slot
+            await availability_index.changed(doctor_id)
         return ehr
 
-    def update_vitals(
+    async def update_vitals(
         self, appointment_id: UUID, data, nurse_id: UUID
     ) -> Optional[EHR]:
-        """Initialize EHR and Update vital signs"""
-        # Get appointment to retrieve patient_id
-        statement = select(Appointment).where(
+        """Record vital signs, creating the EHR on the first call.
+
+        A repeated call updates the same record, appointment_id is unique,
+        so a retried request never creates a second EHR.
+        """
+        statement = select(Appointment.patient_id).where(
             Appointment.id == appointment_id
         )
-        appointment = self.session.exec(statement).one_or_none()
-
-        if not appointment:
-            raise ValueError(
-                f"Appointment with ID {appointment_id} not found"
-            )
+        patient_id = (await self.session.exec(statement)).one_or_none()
+        if patient_id is None:
+            return None
 
-        ehr = EHR(
-            patient_id=appointment.patient_id,
-            nurse_id=nurse_id,
+        vitals = {
+            "nurse_id": nurse_id,
+            "temperature": data.temperature,
+            "blood_pressure": data.blood_pressure,
+            "heart_rate": data.heart_rate,
+        }
+        statement = upsert(EHR).values(
+            patient_id=patient_id,
             appointment_id=appointment_id,
-            temperature=data.temperature,
-            blood_pressure=data.blood_pressure,
-            heart_rate=data.heart_rate,
             status="vitals_recorded",
+            **vitals,
         )
+        statement = statement.on_conflict_do_update(
+            index_elements=[EHR.appointment_id],
+            set_={**vitals, "updated_at": func.now()},
+            where=EHR.status != "completed",
+        ).returning(EHR)
+        ehr = (await self.session.exec(statement)).scalar_one_or_none()
+        if ehr is None:
+            await self.session.rollback()
+            return None
 
-        appointment.status = "VITALS_RECORDED"
-        self.session.add(appointment)
-        self.session.add(ehr)
-        self.session.commit()
-        self.session.refresh(ehr)
+        # Only move a fresh appointment forward, a retry after diagnosis
+        # must not send it back
+        statement = (
+            update(Appointment)
+            .where(
+                Appointment.id == appointment_id,
+                Appointment.status == AppointmentStatus.PENDING,
+            )
+            .values(status=AppointmentStatus.VITALS_RECORDED)
+        )
+        await self.session.exec(statement)
+        await self.session.commit()
+        await triage_index.changed(
+            [appointment_id], status=AppointmentStatus.VITALS_RECORDED
+        )
         return ehr
 
-    def update_diagnosis(
-        self, appointment_id: UUID, doctor_id: UUID, data
-    ) -> Optional[EHR]:
-        """Update diagnosis and prescription by doctor"""
-        statement = select(EHR).where(EHR.appointment_id == appointment_id)
-        ehr = self.session.exec(statement).one_or_none()
-        if not ehr or ehr.doctor_id != doctor_id:
-            return None
+    async def update_vitals_batch(
+        self, records: List[Tuple[int, VitalsRecord]], nurse_id: UUID
+    ) -> List[VitalsBatchError]:
+        """Record vitals for many appointments in one transaction.
 
-        ehr.diagnosis = data.diagnosis
-        ehr.prescription = data.prescription
-        ehr.status = "diagnosed"
+        Takes (index, record) pairs and returns the errors of the rows that
+        could not be recorded, by index. The last reading wins when an
+        appointment appears more than once.
+        """
+        latest = {
+            record.appointment_id: (index, record)
+            for index, record in records
+        }
+        patient_ids = {}
+        for chunk in chunked(list(latest)):
+            statement = select(Appointment.id, Appointment.patient_id).where(
+                Appointment.id.in_(chunk)
+            )
+            patient_ids.update((await self.session.exec(statement)).all())
 
-        statement = select(Appointment).where(
-            Appointment.id == appointment_id
+        errors = []
+        rows = []
+        for appointment_id, (index, record) in latest.items():
+            if appointment_id not in patient_ids:
+                errors.append(
+                    {"index": index, "detail": "Appointment not found"}
+                )
+                continue
+            rows.append(
+                {
+                    "patient_id": patient_ids[appointment_id],
+                    "appointment_id": appointment_id,
+                    "nurse_id": nurse_id,
+                    "temperature": record.temperature,
+                    "blood_pressure": record.blood_pressure,
+                    "heart_rate": record.heart_rate,
+                    "status": "vitals_recorded",
+                }
+            )
+
+        recorded = set()
+        for chunk in chunked(rows):
+            statement = upsert(EHR).values(chunk)
+            statement = statement.on_conflict_do_update(
+                index_elements=[EHR.appointment_id],
+                set_={
+                    **{
+                        field: statement.excluded[field]
+                        for field in VITALS_FIELDS
+                    },
+                    "updated_at": func.now(),
+                },
+                where=EHR.status != "completed",
+            ).returning(EHR.appointment_id)
+            result = await self.session.exec(statement)
+            recorded.update(result.scalars().all())
+        for row in rows:
+            if row["appointment_id"] not in recorded:
+                index = latest[row["appointment_id"]][0]
+                errors.append({"index": index, "detail": "EHR is completed"})
+
+        for chunk in chunked(list(recorded)):
+            statement = (
+                update(Appointment)
+                .where(
+                    Appointment.id.in_(chunk),
+                    Appointment.status == AppointmentStatus.PENDING,
+                )
+                .values(status=AppointmentStatus.VITALS_RECORDED)
+            )
+            await self.session.exec(statement)
+        await self.session.commit()
+        await triage_index.changed(
+            recorded, status=AppointmentStatus.VITALS_RECORDED
         )
-        appointment = self.session.exec(statement).one_or_none()
-        appointment.status = "DIAGNOSED"
+        return errors
 
-        self.session.add(ehr)
-        self.session.add(appointment)
-        self.session.commit()
-        self.session.refresh(ehr)
+    async def update_diagnosis(
+        self, appointment_id: UUID, doctor_id: UUID, data
+    ) -> Optional[EHR]:
+        """Update diagnosis and prescription by doctor"""
+        ehr = await self._transition(
+            appointment_id,
+            guard=[EHR.doctor_id == doctor_id, EHR.status != "completed"],
+            values={
+                "diagnosis": data.diagnosis,
+                "prescription": data.prescription,
+                "status": "diagnosed",
+            },
+            appointment_values={"status": AppointmentStatus.DIAGNOSED},
+        )
+        if ehr:
+            # Seen by the doctor, off the triage queue
+            await triage_index.removed(appointment_id)
         return ehr
 
-    def complete_ehr(
+    async def complete_ehr(
         self, appointment_id: UUID, doctor_id: UUID
     ) -> Optional[EHR]:
         """Mark EHR as completed"""
-        statement = select(EHR).where(EHR.appointment_id == appointment_id)
-        ehr = self.session.exec(statement).one_or_none()
-        if not ehr or ehr.doctor_id != doctor_id:
-            return None
-
-        ehr.status = "completed"
-        statement = select(Appointment).where(
-            Appointment.id == appointment_id
+        ehr = await self._transition(
+            appointment_id,
+            guard=[EHR.doctor_id == doctor_id, EHR.status != "completed"],
+            values={"status": "completed"},
+            appointment_values={"status": AppointmentStatus.COMPLETED},
         )
-        appointment = self.session.exec(statement).one_or_none()
-        appointment.status = "COMPLETED"
+        if ehr:
+            await workload_index.assigned(appointment_id, None)
+            await triage_index.removed(appointment_id)
+        return ehr
 
-        self.session.add(ehr)
-        self.session.add(appointment)
-        self.session.commit()
-        self.session.refresh(ehr)
+    async def _transition(
+        self, appointment_id: UUID, guard, values, appointment_values
+    ) -> Optional[EHR]:
+        """Apply a state change to an EHR and its appointment.
+
+        The guard is checked by the UPDATE itself, so a concurrent change
+        from another user cannot be overwritten between a read and a
+        write. Nothing is changed, and None returned, when it does not
+        match.
+        """
+        statement = (
+            update(EHR)
+            .where(EHR.appointment_id == appointment_id, *guard)
+            .values(**values)
+            .returning(EHR)
+        )
+        ehr = (await self.session.exec(statement)).scalar_one_or_none()
+        if ehr is None:
+            await self.session.rollback()
+            return None
+        statement = (
+            update(Appointment)
+            .where(Appointment.id == appointment_id)
+            .values(**appointment_values)
+        )
+        await self.session.exec(statement)
+        await self.session.commit()
         return ehr
 
-    def get_by_id(self, ehr_id: int) -> Optional[EHR]:
+    async def get_by_id(self, ehr_id: int) -> Optional[EHR]:
         """Get EHR by ID"""
         statement = select(EHR).where(EHR.id == ehr_id)
-        return self.session.exec(statement).one_or_none()
+        return (await self.session.exec(statement)).one_or_none()
 
-    def get_by_appointment(self, appointment_id: UUID) -> Optional[EHR]:
+    async def get_by_appointment(self, appointment_id: UUID) -> Optional[EHR]:
         """Get EHR by appointment ID"""
         statement = select(EHR).where(EHR.appointment_id == appointment_id)
-        return self.session.exec(statement).one_or_none()
+        return (await self.session.exec(statement)).one_or_none()
 
-    def get_patient_records(self, appointment_id: UUID) -> Patient:
+    async def get_patient_records(self, appointment_id: UUID) -> Patient:
         """Get all records for a patient"""
         statement = select(Appointment).where(
             Appointment.id == appointment_id
         )
-        appointment = self.session.exec(statement).one_or_none()
+        appointment = (await self.read_session.exec(statement)).one_or_none()
         statement = (
             select(Patient)
             .where(Patient.id == appointment.patient_id)
             .options(
-                selectinload(Patient.user),
-                selectinload(Patient.appointments),
+                selectinload(Patient.user).selectinload(User.doctor),
+                selectinload(Patient.user).selectinload(User.nurse),
+                selectinload(Patient.user).selectinload(User.patient),
+                selectinload(Patient.appointments).selectinload(
+                    Appointment.doctor
+                ),
+                selectinload(Patient.appointments).selectinload(
+                    Appointment.ehr
+                ),
                 selectinload(Patient.ehr),
             )
         )
-        return self.session.exec(statement).one_or_none()
+        return (await self.read_session.exec(statement)).one_or_none()
 
-    def get_doctor_records(self, doctor_id: UUID) -> List[EHR]:
-        """Get all EHR records assigned to a doctor"""
+    async def get_doctor_records(
+        self, doctor_id: UUID, page: PageParams, status: Optional[str]
+    ) -> Tuple[List[EHR], Optional[str]]:
+        """Get a page of EHR records assigned to a doctor"""
+        columns = (EHR.id,)
         statement = select(EHR).where(EHR.doctor_id == doctor_id)
-        return self.session.exec(statement).all()
+        if status is not None:
+            statement = statement.where(EHR.status == status)
+        statement = paginate(statement, columns, page)
+        records = (await self.read_session.exec(statement)).all()
+        return page_of(records, columns, page)
 
-    def get_pending_for_doctor(self, doctor_id: UUID) -> List[Appointment]:
+    async def get_pending_for_doctor(
+        self, doctor_id: UUID
+    ) -> List[Appointment]:
         """Get pending records for a doctor"""
         statement = (
             select(Appointment)
@@ -158,7 +527,8 @@ class EHRRepository:
             .order_by(Appointment.scheduled_time)
             .options(
                 selectinload(Appointment.patient),
+                selectinload(Appointment.doctor),
                 selectinload(Appointment.ehr),
             )
         )
-        return self.session.exec(statement).all()
+        return (await self.read_session.exec(statement)).all()
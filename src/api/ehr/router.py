@@ -1,15 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, status
+from typing import Any, List, Optional
 from uuid import UUID
 
 from src.api.ehr.service import EHRService
 from src.api.ehr.schema import (
     AppointmentListResponse,
+    AutoAssignResult,
+    EHRDetail,
+    EHRPage,
     PatientRecordResponse,
     VitalSignsInput,
+    VitalsBatchResult,
     DiagnosisInput,
+    appointment_list_serializer,
+    ehr_detail_serializer,
+    ehr_page_serializer,
+    patient_record_serializer,
 )
 from src.api.deps import get_current_user
-from src.api.user.models import User, UserRole
+from src.api.idempotency import Idempotency
+from src.api.pagination import PageParams
+from src.api.principal import Principal
+from src.api.user.models import UserRole
+from src.core.config import settings
 
 router = APIRouter()
 
@@ -19,7 +32,7 @@ async def assign_doctor(
     doctor_id: UUID,
     appointment_id: UUID,
     ehr_service: EHRService = Depends(),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     if current_user.role != UserRole.nurse:
         raise HTTPException(
@@ -27,7 +40,7 @@ async def assign_doctor(
             detail="Only nurses can assign doctors",
         )
 
-    ehr = ehr_service.assign_doctor(doctor_id, appointment_id)
+    ehr = await ehr_service.assign_doctor(doctor_id, appointment_id)
     if not ehr:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -36,12 +49,79 @@ async def assign_doctor(
     return {"message": "Doctor Assigned Successfully"}
 
 
+@router.put("/auto-assign/{appointment_id}")
+async def auto_assign_doctor(
+    appointment_id: UUID,
+    ehr_service: EHRService = Depends(),
+    current_user: Principal = Depends(get_current_user),
+):
+    """Assign the least loaded active doctor (nurses only)"""
+    if current_user.role != UserRole.nurse:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only nurses can assign doctors",
+        )
+
+    ehr = await ehr_service.auto_assign(appointment_id)
+    if not ehr:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="EHR record not found or already completed",
+        )
+    return {
+        "message": "Doctor Assigned Successfully",
+        "doctor_id": ehr.doctor_id,
+    }
+
+
+@router.post("/auto-assign", response_model=AutoAssignResult)
+async def auto_assign_backlog(
+    limit: int = Query(settings.AUTO_ASSIGN_BATCH_MAX_SIZE, ge=1),
+    ehr_service: EHRService = Depends(),
+    current_user: Principal = Depends(get_current_user),
+):
+    """Assign doctors to all unassigned EHRs, most urgent first (nurses only)"""
+    if current_user.role != UserRole.nurse:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only nurses can assign doctors",
+        )
+
+    limit = min(limit, settings.AUTO_ASSIGN_BATCH_MAX_SIZE)
+    return await ehr_service.auto_assign_backlog(limit)
+
+
+# Registered before /vitals/{appointment_id} so "batch" is not read as an id
+@router.post("/vitals/batch", response_model=VitalsBatchResult)
+async def record_vitals_batch(
+    payload: List[Any] = Body(...),
+    ehr_service: EHRService = Depends(),
+    current_user: Principal = Depends(get_current_user),
+):
+    """Record vital signs for many appointments at once (nurses only)"""
+    if current_user.role != UserRole.nurse:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only nurses can record vital signs",
+        )
+    if len(payload) > settings.VITALS_BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {settings.VITALS_BATCH_MAX_SIZE} records per batch",
+        )
+
+    return await ehr_service.record_vitals_batch(
+        payload, current_user.nurse.id
+    )
+
+
 @router.post("/vitals/{appointment_id}")
 async def record_vitals(
     appointment_id: UUID,
     data: VitalSignsInput,
     ehr_service: EHRService = Depends(),
-    current_user: User = Depends(get_current_user),
+    idempotency: Idempotency = Depends(),
+    current_user: Principal = Depends(get_current_user),
 ):
     """Record vital signs (nurses only)"""
     if current_user.role != UserRole.nurse:
@@ -50,8 +130,18 @@ async def record_vitals(
             detail="Only nurses can record vital signs",
         )
 
-    ehr_service.record_vitals(appointment_id, data, current_user.nurse.id)
-    return {"message": "vitals recorded successfully"}
+    replayed = idempotency.replay()
+    if replayed is not None:
+        return replayed
+    ehr = await ehr_service.record_vitals(
+        appointment_id, data, current_user.nurse.id
+    )
+    if not ehr:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Appointment not found or its EHR is already completed",
+        )
+    return idempotency.store({"message": "vitals recorded successfully"})
 
 
 @router.put("/diagnosis/{appointment_id}")
@@ -59,7 +149,7 @@ async def update_diagnosis(
     appointment_id: UUID,
     data: DiagnosisInput,
     ehr_service: EHRService = Depends(),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     """Update diagnosis and prescription (doctors only)"""
     if current_user.role != UserRole.doctor:
@@ -68,7 +158,7 @@ async def update_diagnosis(
             detail="Only doctors can update diagnosis",
         )
 
-    ehr = ehr_service.update_diagnosis(
+    ehr = await ehr_service.update_diagnosis(
         appointment_id, current_user.doctor.id, data
     )
     if not ehr:
@@ -83,7 +173,7 @@ async def update_diagnosis(
 async def complete_ehr(
     appointment_id: UUID,
     ehr_service: EHRService = Depends(),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     """Mark EHR as completed (doctors only)"""
     if current_user.role != UserRole.doctor:
@@ -92,7 +182,9 @@ async def complete_ehr(
             detail="Only doctors can complete EHR records",
         )
 
-    ehr = ehr_service.complete_ehr(appointment_id, current_user.doctor.id)
+    ehr = await ehr_service.complete_ehr(
+        appointment_id, current_user.doctor.id
+    )
     if not ehr:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -105,11 +197,11 @@ async def complete_ehr(
 async def get_patient_records(
     appointment_id: UUID,
     ehr_service: EHRService = Depends(),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     """Get all patient information by appointment ID"""
-    record = ehr_service.get_patient_records(appointment_id)
-    return {"record": record}
+    record = await ehr_service.get_patient_records(appointment_id)
+    return patient_record_serializer.response({"record": record})
 
 
 @router.get(
@@ -118,7 +210,7 @@ async def get_patient_records(
 )
 async def get_pending_for_doctor(
     ehr_service: EHRService = Depends(),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     """Get pending EHR records for the current doctor"""
     if current_user.role != UserRole.doctor:
@@ -126,14 +218,16 @@ async def get_pending_for_doctor(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only doctors can access this endpoint",
         )
-    records = ehr_service.get_pending_for_doctor(current_user.doctor.id)
-    return {"records": records}
+    records = await ehr_service.get_pending_for_doctor(current_user.doctor.id)
+    return appointment_list_serializer.response({"records": records})
 
 
-@router.get("/doctor/all")
+@router.get("/doctor/all", response_model=EHRPage)
 async def get_doctor_records(
+    status: Optional[str] = None,
+    page: PageParams = Depends(),
     ehr_service: EHRService = Depends(),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     """Get pending EHR records for the current doctor"""
     if current_user.role != UserRole.doctor:
@@ -142,37 +236,41 @@ async def get_doctor_records(
             detail="Only doctors can access this endpoint",
         )
 
-    records = ehr_service.get_doctor_records(current_user.doctor.id)
-    return {"records": records}
+    records, next_cursor = await ehr_service.get_doctor_records(
+        current_user.doctor.id, page, status
+    )
+    return ehr_page_serializer.response(
+        {"records": records, "next_cursor": next_cursor}
+    )
 
 
-@router.get("/appointment/{appointment_id}")
+@router.get("/appointment/{appointment_id}", response_model=EHRDetail)
 async def get_by_appointment(
     appointment_id: UUID,
     ehr_service: EHRService = Depends(),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     """Get EHR by appointment ID"""
-    ehr = ehr_service.get_by_appointment(appointment_id)
+    ehr = await ehr_service.get_by_appointment(appointment_id)
     if not ehr:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="EHR record not found for this appointment",
         )
-    return {"ehr": ehr}
+    return ehr_detail_serializer.response({"ehr": ehr})
 
 
-@router.get("/{ehr_id}")
+@router.get("/{ehr_id}", response_model=EHRDetail)
 async def get_by_id(
     ehr_id: int,
     ehr_service: EHRService = Depends(),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     """Get EHR by ID"""
-    ehr = ehr_service.get_by_id(ehr_id)
+    ehr = await ehr_service.get_by_id(ehr_id)
     if not ehr:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="EHR record not found",
         )
-    return {"ehr": ehr}
+    return ehr_detail_serializer.response({"ehr": ehr})
@@ -1,5 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
 from typing import List, Optional
+from typing_extensions import TypedDict
 from uuid import UUID
 from datetime import datetime
 
@@ -8,6 +9,8 @@ from src.api.auth.schemas import (
     NurseResponse,
     PatientResponse,
 )
+from src.api.ehr.model import EHR
+from src.api.responses import Serializer
 
 
 class VitalSignsInput(BaseModel):
@@ -16,6 +19,29 @@ class VitalSignsInput(BaseModel):
     heart_rate: int
 
 
+class VitalsRecord(VitalSignsInput):
+    appointment_id: UUID
+
+
+class VitalsBatchError(TypedDict):
+    index: int
+    detail: str
+
+
+class VitalsBatchResult(TypedDict):
+    recorded: int
+    errors: List[VitalsBatchError]
+
+
+class Assignment(TypedDict):
+    appointment_id: UUID
+    doctor_id: UUID
+
+
+class AutoAssignResult(TypedDict):
+    assigned: List[Assignment]
+
+
 class DiagnosisInput(BaseModel):
     diagnosis: str
     prescription: str
@@ -102,3 +128,26 @@ class PatientResponse(BaseModel):
 
 class PatientRecordResponse(BaseModel):
     record: PatientResponse
+
+
+class EHRPage(TypedDict):
+    records: List[EHR]
+    next_cursor: Optional[str]
+
+
+class EHRDetail(TypedDict):
+    ehr: EHR
+
+
+# Validates a whole batch of vitals in one pass
+vitals_batch_adapter = TypeAdapter(List[VitalsRecord])
+
+# Precompiled serializers for the read endpoints, see Serializer
+patient_record_serializer = Serializer(
+    PatientRecordResponse, from_attributes=True
+)
+appointment_list_serializer = Serializer(
+    AppointmentListResponse, from_attributes=True
+)
+ehr_page_serializer = Serializer(EHRPage)
+ehr_detail_serializer = Serializer(EHRDetail)
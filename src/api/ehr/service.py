@@ -1,7 +1,14 @@
 from fastapi import Depends
+from pydantic import ValidationError
+from typing import Any, List
 from uuid import UUID
 
 from src.api.ehr.repository import EHRRepository
+from src.api.ehr.schema import (
+    AutoAssignResult,
+    VitalsBatchResult,
+    vitals_batch_adapter,
+)
 from src.api.sse.service import SSEService
 
 
@@ -13,51 +20,114 @@ class EHRService:
         self.repository = repository
         self.sse_service = SSEService()
 
-    def record_vitals(self, appointment_id: UUID, data, nurse_id: UUID):
+    async def record_vitals(self, appointment_id: UUID, data, nurse_id: UUID):
         """Record vital signs"""
-        ehr = self.repository.update_vitals(appointment_id, data, nurse_id)
+        ehr = await self.repository.update_vitals(
+            appointment_id, data, nurse_id
+        )
         return ehr
 
-    def assign_doctor(self, doctor_id: UUID, appointment_id: UUID):
+    async def record_vitals_batch(
+        self, payload: List[Any], nurse_id: UUID
+    ) -> VitalsBatchResult:
+        """Validate and record a batch of vitals, reporting errors per row"""
+        messages = {}
+        try:
+            records = vitals_batch_adapter.validate_python(payload)
+            valid = list(enumerate(records))
+        except ValidationError as exc:
+            for error in exc.errors():
+                index, *field = error["loc"]
+                field = ".".join(str(part) for part in field)
+                messages.setdefault(index, []).append(
+                    f"{field}: {error['msg']}" if field else error["msg"]
+                )
+            # Revalidate the rows that passed in a second single pass
+            indexes = [i for i in range(len(payload)) if i not in messages]
+            records = vitals_batch_adapter.validate_python(
+                [payload[i] for i in indexes]
+            )
+            valid = list(zip(indexes, records))
+
+        errors = [
+            {"index": index, "detail": "; ".join(details)}
+            for index, details in messages.items()
+        ]
+        if valid:
+            errors += await self.repository.update_vitals_batch(
+                valid, nurse_id
+            )
+        errors.sort(key=lambda error: error["index"])
+        return {"recorded": len(payload) - len(errors), "errors": errors}
+
+    async def assign_doctor(self, doctor_id: UUID, appointment_id: UUID):
         """Assign a doctor to an appointment"""
-        ehr = self.repository.assign_doctor(doctor_id, appointment_id)
+        ehr = await self.repository.assign_doctor(doctor_id, appointment_id)
         if ehr:
-            # Notify the assigned doctor
-            self.sse_service.send_notification(
-                {
-                    "type": "patient_vitals_recorded",
-                    "recipient_id": str(ehr.doctor_id),
-                    "patient_id": str(ehr.patient_id),
-                },
-            )
+            await self._notify_assigned(ehr.doctor_id, ehr.patient_id)
         return ehr
 
-    def update_diagnosis(self, appointment_id: UUID, doctor_id: UUID, data):
+    async def auto_assign(self, appointment_id: UUID):
+        """Assign the least loaded active doctor to an appointment"""
+        ehr = await self.repository.auto_assign(appointment_id)
+        if ehr:
+            await self._notify_assigned(ehr.doctor_id, ehr.patient_id)
+        return ehr
+
+    async def auto_assign_backlog(self, limit: int) -> AutoAssignResult:
+        """Assign doctors to every unassigned EHR, most urgent first"""
+        assigned = await self.repository.auto_assign_backlog(limit)
+        for _, patient_id, doctor_id in assigned:
+            await self._notify_assigned(doctor_id, patient_id)
+        return {
+            "assigned": [
+                {"appointment_id": appointment_id, "doctor_id": doctor_id}
+                for appointment_id, _, doctor_id in assigned
+            ]
+        }
+
+    async def _notify_assigned(self, doctor_id: UUID, patient_id: UUID):
+        # Notify the assigned doctor, SSE clients connect with their user id
+        user_id = await self.repository.doctor_user_id(doctor_id)
+        await self.sse_service.send_notification(
+            {
+                "type": "patient_vitals_recorded",
+                "recipient_id": user_id,
+                "doctor_id": str(doctor_id),
+                "patient_id": str(patient_id),
+            },
+        )
+
+    async def update_diagnosis(
+        self, appointment_id: UUID, doctor_id: UUID, data
+    ):
         """Update diagnosis and prescription"""
-        return self.repository.update_diagnosis(
+        return await self.repository.update_diagnosis(
             appointment_id, doctor_id, data
         )
 
-    def complete_ehr(self, appointment_id: UUID, doctor_id: UUID):
+    async def complete_ehr(self, appointment_id: UUID, doctor_id: UUID):
         """Mark EHR as completed"""
-        return self.repository.complete_ehr(appointment_id, doctor_id)
+        return await self.repository.complete_ehr(appointment_id, doctor_id)
 
-    def get_patient_records(self, appointment_id: UUID):
+    async def get_patient_records(self, appointment_id: UUID):
         """Get all EHR records for a patient"""
-        return self.repository.get_patient_records(appointment_id)
+        return await self.repository.get_patient_records(appointment_id)
 
-    def get_doctor_records(self, doctor_id: UUID):
-        """Get all EHR records assigned to a doctor"""
-        return self.repository.get_doctor_records(doctor_id)
+    async def get_doctor_records(self, doctor_id: UUID, page, status):
+        """Get a page of EHR records assigned to a doctor"""
+        return await self.repository.get_doctor_records(
+            doctor_id, page, status
+        )
 
-    def get_pending_for_doctor(self, doctor_id: UUID):
+    async def get_pending_for_doctor(self, doctor_id: UUID):
         """Get pending EHR records for a doctor"""
-        return self.repository.get_pending_for_doctor(doctor_id)
+        return await self.repository.get_pending_for_doctor(doctor_id)
 
-    def get_by_appointment(self, appointment_id: UUID):
+    async def get_by_appointment(self, appointment_id: UUID):
         """Get EHR by appointment ID"""
-        return self.repository.get_by_appointment(appointment_id)
+        return await self.repository.get_by_appointment(appointment_id)
 
-    def get_by_id(self, ehr_id: int):
+    async def get_by_id(self, ehr_id: int):
         """Get EHR by ID"""
-        return self.repository.get_by_id(ehr_id)
+        return await self.repository.get_by_id(ehr_id)
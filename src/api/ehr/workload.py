@@ -0,0 +1,203 @@
+import heapq
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+from uuid import UUID
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.api.appointment.model import (
+    Appointment,
+    AppointmentStatus,
+    UrgencyLevel,
+)
+from src.api.user.directory import doctor_directory
+from src.core.broker import broker
+from src.core.config import settings
+from src.core.synced import SyncedIndex
+
+WORKLOAD_CHANNEL = "doctor_workload"
+CLOSED_STATUSES = (AppointmentStatus.COMPLETED, AppointmentStatus.CANCELED)
+
+
+def urgency_weight(urgency) -> int:
+    """Workload an open appointment adds to its doctor, 1 to 3"""
+    return int(UrgencyLevel(urgency).value)
+
+
+class WorkloadIndex(SyncedIndex):
+    """Per-doctor workload of open appointments, for automatic assignment"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        # Messages state where an appointment stands rather than a delta,
+        # so applying one twice is harmless
+        self.assignments: Dict[UUID, Tuple[UUID, int]] = {}
+        self.loads: Dict[UUID, int] = {}
+        # (load, doctor_id) of the active doctors, outdated entries included
+        self.heap: List[Tuple[int, UUID]] = []
+        self.active: FrozenSet[UUID] = frozenset()
+        self.directory_version: Optional[int] = None
+
+    @property
+    def resync_seconds(self) -> float:
+        return settings.WORKLOAD_RESYNC_SECONDS
+
+    async def ready(self, session: AsyncSession) -> None:
+        """Load the index if needed and follow the active doctors"""
+        await super().ready(session)
+        snapshot = await doctor_directory.snapshot(session)
+        if snapshot.version != self.directory_version:
+            self.active = frozenset(
+                doctor.id
+                for doctor in snapshot.doctors
+                if doctor.status == "active"
+            )
+            self.directory_version = snapshot.version
+            self._rebuild_heap()
+
+    async def _query(self, session: AsyncSession) -> list:
+        statement = select(
+            Appointment.id,
+            Appointment.doctor_id,
+            Appointment.urgency_level,
+        ).where(
+            Appointment.doctor_id.is_not(None),
+            Appointment.status.not_in(CLOSED_STATUSES),
+        )
+        return (await session.exec(statement)).all()
+
+    def _seed(self, rows: list) -> None:
+        self.assignments = {
+            appointment_id: (doctor_id, urgency_weight(urgency))
+            for appointment_id, doctor_id, urgency in rows
+        }
+        self.loads = {}
+        for doctor_id, weight in self.assignments.values():
+            self.loads[doctor_id] = self.loads.get(doctor_id, 0) + weight
+        self._rebuild_heap()
+
+    def _rebuild_heap(self) -> None:
+        self.heap = [
+            (self.loads.get(doctor_id, 0), doctor_id)
+            for doctor_id in self.active
+        ]
+        heapq.heapify(self.heap)
+
+    def _set(self, appointment_id: UUID, doctor_id: UUID, weight: int):
+        self.assignments[appointment_id] = (doctor_id, weight)
+        self._add(doctor_id, weight)
+
+    def _add(self, doctor_id: UUID, weight: int) -> None:
+        load = self.loads.get(doctor_id, 0) + weight
+        self.loads[doctor_id] = load
+        if doctor_id in self.active:
+            heapq.heappush(self.heap, (load, doctor_id))
+            if self.outgrown(self.heap, len(self.active)):
+                self._rebuild_heap()
+
+    def _apply(self, message: dict) -> None:
+        """Moves one appointment to its stated doctor"""
+        appointment_id = UUID(str(message["appointment_id"]))
+        doctor_id = message.get("doctor_id")
+        previous = self.assignments.pop(appointment_id, None)
+        if previous is not None:
+            self._add(previous[0], -previous[1])
+        if doctor_id is not None:
+            self._set(
+                appointment_id, UUID(str(doctor_id)), int(message["weight"])
+            )
+
+    def least_loaded(
+        self, excluded: Set[UUID] = frozenset()
+    ) -> Optional[UUID]:
+        """The active doctor with the lowest workload, O(log n) amortized.
+
+        Doctors in `excluded` are passed over, at O(log n) each.
+        """
+        heap = self.heap
+        passed = []
+        doctor_id = None
+        while heap:
+            load, candidate = heap[0]
+            if (
+                candidate not in self.active
+                or self.loads.get(candidate, 0) != load
+            ):
+                heapq.heappop(heap)
+            elif candidate in excluded:
+                passed.append(heapq.heappop(heap))
+            else:
+                doctor_id = candidate
+                break
+        for entry in passed:
+            heapq.heappush(heap, entry)
+        return doctor_id
+
+    def plan(
+        self,
+        backlog: List[Tuple[UUID, object]],
+        excluded: Optional[Dict[UUID, Set[UUID]]] = None,
+    ) -> Dict[UUID, UUID]:
+        """Spread a backlog of (appointment_id, urgency) over the doctors.
+
+        The plan is applied to the index as it is made, so each pick sees
+        the earlier ones. Call `invalidate` if it is not committed. An
+        appointment is never planned for a doctor in its `excluded` set,
+        and is left out when no other doctor is active.
+        """
+        excluded = excluded or {}
+        plan = {}
+        for appointment_id, urgency in backlog:
+            doctor_id = self.least_loaded(
+                excluded.get(appointment_id, frozenset())
+            )
+            if doctor_id is None:
+                continue
+            self.apply(
+                {
+                    "appointment_id": appointment_id,
+                    "doctor_id": doctor_id,
+                    "weight": urgency_weight(urgency),
+                }
+            )
+            plan[appointment_id] = doctor_id
+        return plan
+
+    async def assigned(
+        self, appointment_id: UUID, doctor_id: Optional[UUID], urgency=None
+    ) -> None:
+        """Call after committing an appointment's doctor, None to close it"""
+        message = {
+            "appointment_id": str(appointment_id),
+            "doctor_id": str(doctor_id) if doctor_id else None,
+            "weight": urgency_weight(urgency) if doctor_id else 0,
+        }
+        self.apply(message)
+        await broker.publish(WORKLOAD_CHANNEL, message)
+
+    async def track(self, appointment: Appointment) -> None:
+        """Call after committing any change to an appointment"""
+        if appointment.status in CLOSED_STATUSES:
+            await self.assigned(appointment.id, None)
+        else:
+            await self.assigned(
+                appointment.id,
+                appointment.doctor_id,
+                appointment.urgency_level,
+            )
+
+    def stats(self) -> dict:
+        loads = [self.loads.get(d, 0) for d in self.active]
+        return {
+            "active_doctors": len(self.active),
+            "open_assignments": len(self.assignments),
+            "min_load": min(loads, default=0),
+            "max_load": max(loads, default=0),
+            "heap_size": len(self.heap),
+            "loads": self.reloads,
+        }
+
+
+workload_index = WorkloadIndex()
+broker.subscribe(WORKLOAD_CHANNEL, workload_index.apply)
+broker.on_resync(workload_index.invalidate)
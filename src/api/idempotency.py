@@ -0,0 +1,44 @@
+from typing import Any, Optional
+
+from fastapi import Depends, Header, Request
+
+from src.api.deps import get_current_user
+from src.api.principal import Principal
+from src.core.cache import TTLCache
+from src.core.config import settings
+
+# Successful responses by (user, method, path, Idempotency-Key). Per
+# worker, a retry landing on another one runs again, so writes must be
+# idempotent too
+idempotency_cache = TTLCache(
+    maxsize=settings.IDEMPOTENCY_CACHE_SIZE, ttl=settings.IDEMPOTENCY_TTL
+)
+
+
+class Idempotency:
+    """Replays the response to a request retried with its Idempotency-Key"""
+
+    def __init__(
+        self,
+        request: Request,
+        idempotency_key: Optional[str] = Header(None),
+        current_user: Principal = Depends(get_current_user),
+    ) -> None:
+        self.key = None
+        if idempotency_key:
+            self.key = (
+                current_user.id,
+                request.method,
+                request.url.path,
+                idempotency_key,
+            )
+
+    def replay(self) -> Optional[Any]:
+        if self.key is None:
+            return None
+        return idempotency_cache.get(self.key)
+
+    def store(self, response: Any) -> Any:
+        if self.key is not None:
+            idempotency_cache.set(self.key, response)
+        return response
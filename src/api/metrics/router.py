@@ -0,0 +1,76 @@
+from fastapi import APIRouter, Depends
+
+from src.api.appointment.availability import availability_index
+from src.api.appointment.triage import triage_index
+from src.api.auth.hashing import password_hasher
+from src.api.ehr.workload import workload_index
+from src.api.principal import principal_cache
+from src.api.rbac import RoleCheck
+from src.api.sse.service import SSEService
+from src.api.user.directory import doctor_directory
+from src.api.user.models import UserRole
+from src.core.broker import broker
+from src.core.database import async_engine, replicas
+from src.core.pool import pool_metrics
+
+router = APIRouter(dependencies=[Depends(RoleCheck([UserRole.admin]))])
+
+
+@router.get("/db-pool")
+async def read_db_pool_metrics():
+    """Connection pool usage for sizing the pool per deployment"""
+    return pool_metrics.snapshot(async_engine.pool)
+
+
+@router.get("/db-replicas")
+async def read_db_replica_metrics():
+    """Health of the read replicas as last checked"""
+    return replicas.stats()
+
+
+@router.get("/broker")
+async def read_broker_metrics():
+    """Failed publishes and listener reconnects of the pub/sub backend"""
+    return broker.stats()
+
+
+@router.get("/auth-cache")
+async def read_auth_cache_metrics():
+    """Hit and miss counters of the authenticated principal cache"""
+    return principal_cache.stats()
+
+
+@router.get("/password-hashing")
+async def read_password_hashing_metrics():
+    """Saturation of the bcrypt worker pool"""
+    return password_hasher.stats()
+
+
+@router.get("/sse")
+async def read_sse_metrics():
+    """Connected SSE clients, queue depth and dropped events"""
+    return SSEService().stats()
+
+
+@router.get("/doctor-directory")
+async def read_doctor_directory_metrics():
+    """Version and reload count of the cached doctor directory"""
+    return doctor_directory.stats()
+
+
+@router.get("/availability")
+async def read_availability_metrics():
+    """Doctors and booked intervals held by the availability index"""
+    return availability_index.stats()
+
+
+@router.get("/workload")
+async def read_workload_metrics():
+    """Open assignments and load spread of the auto-assignment index"""
+    return workload_index.stats()
+
+
+@router.get("/triage")
+async def read_triage_metrics():
+    """Size and reload count of the in-memory triage queue"""
+    return triage_index.stats()
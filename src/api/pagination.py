@@ -0,0 +1,65 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Optional
+
+from fastapi import HTTPException, Query
+from sqlalchemy import tuple_
+
+
+class PageParams:
+    """Keyset pagination query parameters shared by the list endpoints"""
+
+    def __init__(
+        self,
+        limit: int = Query(50, ge=1, le=200),
+        cursor: Optional[str] = Query(None),
+    ) -> None:
+        self.limit = limit
+        self.cursor = cursor
+
+
+def encode_cursor(values) -> str:
+    raw = json.dumps(values, default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor: str, columns) -> list:
+    """Turn a cursor back into values typed like the sort columns"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if len(values) != len(columns):
+            raise ValueError("cursor does not match sort keys")
+        decoded = []
+        for value, column in zip(values, columns):
+            python_type = column.type.python_type
+            if python_type is datetime:
+                decoded.append(datetime.fromisoformat(value))
+            else:
+                decoded.append(python_type(value))
+        return decoded
+    except (binascii.Error, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def paginate(statement, columns, page: PageParams):
+    """Order by the sort keys and seek past the cursor.
+
+    One extra row is fetched so `page_of` can tell whether a next page
+    exists without a COUNT query.
+    """
+    if page.cursor:
+        values = decode_cursor(page.cursor, columns)
+        statement = statement.where(tuple_(*columns) > tuple_(*values))
+    return statement.order_by(*columns).limit(page.limit + 1)
+
+
+def page_of(rows, columns, page: PageParams) -> tuple:
+    """Split a paginated result into the page and the next cursor"""
+    rows = list(rows)
+    if len(rows) <= page.limit:
+        return rows, None
+    rows = rows[: page.limit]
+    last = rows[-1]
+    return rows, encode_cursor([getattr(last, c.key) for c in columns])
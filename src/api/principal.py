@@ -0,0 +1,59 @@
+from dataclasses import dataclass
+from typing import Optional
+from uuid import UUID
+
+from src.api.user.models import User, UserRole
+from src.core.broker import broker
+from src.core.cache import TTLCache
+from src.core.config import settings
+
+PRINCIPAL_CHANNEL = "principal_cache"
+
+
+@dataclass(frozen=True)
+class EntityRef:
+    id: UUID
+
+
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated caller, detached from any database session"""
+
+    id: UUID
+    role: UserRole
+    doctor: Optional[EntityRef] = None
+    nurse: Optional[EntityRef] = None
+    patient: Optional[EntityRef] = None
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(
+            id=user.id,
+            role=user.role,
+            doctor=EntityRef(user.doctor.id) if user.doctor else None,
+            nurse=EntityRef(user.nurse.id) if user.nurse else None,
+            patient=EntityRef(user.patient.id) if user.patient else None,
+        )
+
+
+class PrincipalCache(TTLCache):
+    """Authenticated principals keyed by (user id, token)"""
+
+    def invalidate_user(self, user_id) -> None:
+        user_id = UUID(str(user_id))
+        self.discard_where(lambda key: key[0] == user_id)
+
+    def invalidate(self, message: dict) -> None:
+        self.invalidate_user(message["user_id"])
+
+    async def user_changed(self, user_id) -> None:
+        """Call after committing a change to a user or their password"""
+        self.invalidate_user(user_id)
+        await broker.publish(PRINCIPAL_CHANNEL, {"user_id": str(user_id)})
+
+
+principal_cache = PrincipalCache(
+    maxsize=settings.AUTH_CACHE_SIZE, ttl=settings.AUTH_CACHE_TTL
+)
+broker.subscribe(PRINCIPAL_CHANNEL, principal_cache.invalidate)
+broker.on_resync(principal_cache.clear)
@@ -0,0 +1,35 @@
+from typing import Any
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+from src.core.serialization import dumps
+
+
+class FastJSONResponse(Response):
+    """JSON response that takes already encoded bytes as its body"""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
+
+
+class Serializer:
+    """Response shape compiled once into a pydantic serializer"""
+
+    def __init__(self, shape: Any, from_attributes: bool = False) -> None:
+        self.adapter = TypeAdapter(shape)
+        self.from_attributes = from_attributes
+
+    def dump(self, content: Any) -> bytes:
+        if self.from_attributes:
+            content = self.adapter.validate_python(
+                content, from_attributes=True
+            )
+        return self.adapter.dump_json(content)
+
+    def response(self, content: Any, status_code: int = 200) -> Response:
+        return FastJSONResponse(self.dump(content), status_code=status_code)
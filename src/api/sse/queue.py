@@ -0,0 +1,60 @@
+import asyncio
+import time
+from collections import deque
+
+
+class ClientClosed(Exception):
+    """Raised to the stream of a client that was evicted"""
+
+
+class ClientQueue:
+    """Outbox of a single SSE client"""
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self.high = deque()
+        self.normal = deque()
+        self.dropped = 0
+        self.closed = False
+        # Last time the stream drained a message or found nothing to drain
+        self.last_drained = time.monotonic()
+        self._ready = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self.high) + len(self.normal)
+
+    def put(self, message, priority: str = "normal") -> None:
+        if priority == "high":
+            self.high.append(message)
+        else:
+            # A dashboard only needs the latest state, high priority
+            # events are never dropped
+            if len(self.normal) >= self.maxsize:
+                self.normal.popleft()
+                self.dropped += 1
+            self.normal.append(message)
+        self._ready.set()
+
+    async def get(self):
+        while not len(self):
+            if self.closed:
+                raise ClientClosed()
+            self.last_drained = time.monotonic()
+            self._ready.clear()
+            await self._ready.wait()
+        if self.closed:
+            raise ClientClosed()
+        self.last_drained = time.monotonic()
+        if self.high:
+            return self.high.popleft()
+        return self.normal.popleft()
+
+    def close(self) -> None:
+        self.closed = True
+        self._ready.set()
+
+    def is_stalled(self, timeout: float) -> bool:
+        """Messages are waiting but the stream has not taken one lately"""
+        return len(self) > 0 and (
+            time.monotonic() - self.last_drained > timeout
+        )
@@ -1,8 +1,23 @@
-import json
 import asyncio
-from typing import Dict
-from fastapi import FastAPI
-from sse_starlette.sse import EventSourceResponse
+from collections import defaultdict, deque
+from typing import Dict, List, NamedTuple, Optional
+from uuid import UUID
+from fastapi import FastAPI, Header
+from sse_starlette.sse import EventSourceResponse, ServerSentEvent
+
+from src.api.sse.queue import ClientClosed, ClientQueue
+from src.core.broker import broker
+from src.core.config import settings
+from src.core.serialization import dumps
+
+SSE_CHANNEL = "sse_notifications"
+
+
+class Event(NamedTuple):
+    id: int
+    priority: str
+    # The encoded SSE frame, built once and shared by every subscriber
+    frame: bytes
 
 
 class SSEService:
@@ -12,53 +27,172 @@ class SSEService:
         if cls._instance is None:
             cls._instance = super(SSEService, cls).__new__(cls)
             cls._instance.clients = {}
+            # client ids by client type, so a broadcast never scans
+            # clients it is not meant for
+            cls._instance.clients_by_type = defaultdict(set)
             cls._instance.notification_queue = asyncio.Queue()
+            cls._instance.dropped = 0
+            cls._instance.evicted = 0
+            cls._instance.reaper = None
+            # Recent events per audience, replayed on reconnect
+            cls._instance.history = defaultdict(
+                lambda: deque(maxlen=settings.SSE_REPLAY_BUFFER_SIZE)
+            )
         return cls._instance
 
-    async def stream(self, client_id: str, client_type: str):
-        if client_id not in self.clients:
-            self.clients[client_id] = {
-                "type": client_type,
-                "queue": asyncio.Queue(),
-            }
+    async def stream(
+        self,
+        client_id: str,
+        client_type: str,
+        last_event_id: Optional[int] = None,
+    ):
+        previous = self.clients.get(client_id)
+        if previous is not None:
+            # A reconnect while the old stream is still open. End that one,
+            # or it keeps taking events meant for this connection
+            self.remove_client(client_id, previous["queue"])
+        client_queue = ClientQueue(settings.SSE_QUEUE_SIZE)
+        self.clients[client_id] = {"type": client_type, "queue": client_queue}
+        self.clients_by_type[client_type].add(client_id)
 
-        client_queue = self.clients[client_id]["queue"]
+        if last_event_id is not None:
+            for event in self.missed_events(
+                client_id, client_type, last_event_id
+            ):
+                client_queue.put(event, event.priority)
 
         async def event_generator():
             try:
                 while True:
-                    if client_queue.empty():
-                        # Keep connection alive with comment
-                        yield {"event": "ping", "data": ""}
-                        await asyncio.sleep(15)
-                        continue
-
-                    message = await client_queue.get()
-                    yield {
-                        "event": "message",
-                        "data": json.dumps(message, default=str),
-                    }
-
-            except asyncio.CancelledError:
-                # Client disconnected
-                if client_id in self.clients:
-                    del self.clients[client_id]
-
-        return EventSourceResponse(event_generator())
-
-    def send_notification(self, data: Dict, priority: str = "normal"):
+                    # Wakes as soon as a notification is queued, keepalive
+                    # pings are sent by EventSourceResponse on their own timer
+                    event = await client_queue.get()
+                    yield event.frame
+            except ClientClosed:
+                # Evicted as a slow consumer, end the response
+                pass
+            finally:
+                # Client disconnected or was evicted
+                self.remove_client(client_id, client_queue)
+
+        return EventSourceResponse(
+            event_generator(),
+            ping=settings.SSE_PING_INTERVAL,
+            ping_message_factory=lambda: ServerSentEvent(
+                event="ping", data=""
+            ),
+        )
+
+    async def send_notification(self, data: Dict, priority: str = "normal"):
         """
-        Send notification to appropriate clients
+        Publish a notification to the clients of every worker
         """
-        # Push notifications to queues for specific types of clients (nurse, doctor)
-        for client_id, client_info in self.clients.items():
-            # For normal appointments, notify just doctors and nurses
-            # For emergencies, notify all connected clients
-            if priority == "high" or client_info["type"] in [
-                "nurse",
-                "doctor",
-            ]:
-                client_info["queue"].put_nowait(data)
+        recipient_id = data.get("recipient_id")
+        await broker.publish(
+            SSE_CHANNEL,
+            {
+                "priority": priority,
+                "recipient_id": (
+                    str(recipient_id) if recipient_id is not None else None
+                ),
+                # Serialized here once, not once per subscriber
+                "data": dumps(data).decode(),
+            },
+            # Ids come from a sequence shared by every worker, so a client
+            # resuming from one misses nothing published by another
+            numbered=True,
+        )
+
+    def deliver(self, message: Dict):
+        """
+        Push a published notification to this worker's clients
+        """
+        frame = ServerSentEvent(
+            message["data"], event="message", id=str(message["id"])
+        ).encode()
+        event = Event(message["id"], message["priority"], frame)
+        audience = self.audience(message)
+        self.history[audience].append(event)
+        for client_id in self.recipients(audience):
+            self.clients[client_id]["queue"].put(event, event.priority)
+
+    def audience(self, message: Dict):
+        # Targeted notifications only go to their recipient, by user id
+        if message["recipient_id"] is not None:
+            return ("recipient", message["recipient_id"])
+        # For emergencies, notify all connected clients
+        if message["priority"] == "high":
+            return "all"
+        # For normal appointments, notify just doctors and nurses
+        return "staff"
+
+    def recipients(self, audience):
+        if audience == "all":
+            return list(self.clients)
+        if audience == "staff":
+            return [
+                *self.clients_by_type.get("nurse", ()),
+                *self.clients_by_type.get("doctor", ()),
+            ]
+        recipient_id = audience[1]
+        return [recipient_id] if recipient_id in self.clients else []
+
+    def missed_events(
+        self, client_id: str, client_type: str, last_event_id: int
+    ) -> List[Event]:
+        """
+        Buffered events for a client published after last_event_id
+        """
+        audiences = ["all", ("recipient", client_id)]
+        if client_type in ["nurse", "doctor"]:
+            audiences.append("staff")
+        missed = [
+            event
+            for audience in audiences
+            for event in self.history.get(audience, ())
+            if event.id > last_event_id
+        ]
+        return sorted(missed, key=lambda event: event.id)
+
+    def remove_client(self, client_id: str, client_queue: ClientQueue):
+        client_info = self.clients.get(client_id)
+        # A reconnect may already have replaced the entry with a new queue
+        if client_info is None or client_info["queue"] is not client_queue:
+            return
+        del self.clients[client_id]
+        self.clients_by_type[client_info["type"]].discard(client_id)
+        self.dropped += client_queue.dropped
+        client_queue.close()
+
+    async def reap_stalled_clients(self):
+        """
+        Evict clients that stopped draining their queue
+        """
+        timeout = settings.SSE_CLIENT_IDLE_TIMEOUT
+        while True:
+            await asyncio.sleep(timeout / 2)
+            for client_id, client_info in list(self.clients.items()):
+                if client_info["queue"].is_stalled(timeout):
+                    self.evicted += 1
+                    self.remove_client(client_id, client_info["queue"])
+
+    async def start_reaper(self):
+        self.reaper = asyncio.create_task(self.reap_stalled_clients())
+
+    async def stop_reaper(self):
+        if self.reaper:
+            self.reaper.cancel()
+
+    def stats(self) -> Dict:
+        depths = [len(info["queue"]) for info in self.clients.values()]
+        return {
+            "clients": len(self.clients),
+            "queued": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "dropped": self.dropped
+            + sum(info["queue"].dropped for info in self.clients.values()),
+            "evicted": self.evicted,
+        }
 
 
 def setup_sse_routes(app: FastAPI):
@@ -66,7 +200,24 @@ def setup_sse_routes(app: FastAPI):
     Setup SSE routes for the FastAPI app
     """
     sse_service = SSEService()
+    # Each worker subscribes once and fans out to its own clients
+    broker.subscribe(SSE_CHANNEL, sse_service.deliver)
+    app.add_event_handler("startup", sse_service.start_reaper)
+    app.add_event_handler("shutdown", sse_service.stop_reaper)
 
+    # Clients connect with their user id, the one targeted notifications
+    # carry as recipient_id
     @app.get("/api/notifications/{client_id}/{client_type}")
-    async def sse_client(client_id: str, client_type: str):
-        return await sse_service.stream(client_id, client_type)
+    async def sse_client(
+        client_id: UUID,
+        client_type: str,
+        last_event_id: Optional[str] = Header(None),
+    ):
+        # Browsers send Last-Event-ID on their own when they reconnect, an
+        # id we did not issue just means there is nothing to replay
+        resume_from = None
+        if last_event_id and last_event_id.isdigit():
+            resume_from = int(last_event_id)
+        return await sse_service.stream(
+            str(client_id), client_type, resume_from
+        )
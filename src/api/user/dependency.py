@@ -3,8 +3,8 @@ from fastapi import HTTPException, Depends
 from src.api.user.service import UserService
 
 
-def get_user(user_id: int, user_service: UserService = Depends()):
-    user = user_service.get_user(user_id)
+async def get_user(user_id: int, user_service: UserService = Depends()):
+    user = await user_service.get_user(user_id)
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
     return user
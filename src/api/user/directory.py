@@ -0,0 +1,119 @@
+import asyncio
+import hashlib
+from bisect import bisect_right
+from itertools import islice
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from uuid import UUID
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.api.pagination import PageParams, decode_cursor, encode_cursor
+from src.api.responses import Serializer
+from src.api.user.models import Doctor
+from src.core.broker import broker
+
+DIRECTORY_CHANNEL = "doctor_directory"
+SORT_COLUMNS = (Doctor.created_at, Doctor.id)
+
+active_doctors_serializer = Serializer(List[Doctor])
+
+
+class DirectorySnapshot(NamedTuple):
+    version: int
+    # Every doctor in (created_at, id) order, with the sort keys alongside.
+    # They belong to no session and are shared, callers must not modify them
+    doctors: Tuple[Doctor, ...]
+    keys: List[tuple]
+    # Doctor id -> the id of their user, which SSE clients connect with
+    user_ids: Dict[UUID, UUID]
+    # Encoded once per snapshot, polls send these bytes as they are
+    active_body: bytes
+    active_etag: str
+
+
+class DoctorDirectory:
+    """In-process snapshot of the doctors table for the directory endpoints"""
+
+    def __init__(self) -> None:
+        self.version = 0
+        self.loads = 0
+        self._snapshot: Optional[DirectorySnapshot] = None
+        self._lock = asyncio.Lock()
+
+    async def snapshot(self, session: AsyncSession) -> DirectorySnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+        async with self._lock:
+            if self._snapshot is not None:
+                return self._snapshot
+            version = self.version
+            # Plain column rows, ORM instances would stay bound to this
+            # request's session and expire with its next rollback
+            rows = await session.exec(select(*Doctor.__table__.columns))
+            doctors = [Doctor(**row._asdict()) for row in rows.all()]
+            snapshot = self._build(version, doctors)
+            self.loads += 1
+            # A change that landed during the load makes it stale already
+            if self.version == version:
+                self._snapshot = snapshot
+            return snapshot
+
+    def _build(self, version: int, doctors) -> DirectorySnapshot:
+        doctors = sorted(doctors, key=lambda d: (d.created_at, d.id))
+        active_body = active_doctors_serializer.dump(
+            [doctor for doctor in doctors if doctor.status == "active"]
+        )
+        digest = hashlib.blake2b(active_body, digest_size=16).hexdigest()
+        return DirectorySnapshot(
+            version=version,
+            doctors=tuple(doctors),
+            keys=[(doctor.created_at, doctor.id) for doctor in doctors],
+            user_ids={doctor.id: doctor.user_id for doctor in doctors},
+            active_body=active_body,
+            active_etag=f'"{digest}"',
+        )
+
+    async def page(
+        self, session: AsyncSession, page: PageParams, status: Optional[str]
+    ) -> tuple:
+        """Same pages as the keyset query over (created_at, id)"""
+        snapshot = await self.snapshot(session)
+        start = 0
+        if page.cursor:
+            key = tuple(decode_cursor(page.cursor, SORT_COLUMNS))
+            start = bisect_right(snapshot.keys, key)
+        doctors = []
+        for doctor in islice(snapshot.doctors, start, None):
+            if status is None or doctor.status == status:
+                doctors.append(doctor)
+                if len(doctors) > page.limit:
+                    break
+        if len(doctors) <= page.limit:
+            return doctors, None
+        # One doctor past the page was collected to detect a next page
+        doctors = doctors[:-1]
+        last = doctors[-1]
+        return doctors, encode_cursor([last.created_at, last.id])
+
+    def invalidate(self, message: Optional[dict] = None) -> None:
+        self.version += 1
+        self._snapshot = None
+
+    async def changed(self) -> None:
+        """Call after committing a doctor change"""
+        self.invalidate()
+        await broker.publish(DIRECTORY_CHANNEL, {})
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "loaded": self._snapshot is not None,
+            "loads": self.loads,
+        }
+
+
+doctor_directory = DoctorDirectory()
+broker.subscribe(DIRECTORY_CHANNEL, doctor_directory.invalidate)
+broker.on_resync(doctor_directory.invalidate)
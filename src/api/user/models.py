@@ -36,6 +36,10 @@ class User(ModelBase, SQLModel, table=True):
     hash: str
     otp: Optional[str] = Field(default=None, nullable=True)
     otp_expiry: Optional[datetime] = Field(default=None, nullable=True)
+    # Tokens issued before this (UTC) are no longer accepted
+    password_changed_at: Optional[datetime] = Field(
+        default=None, nullable=True
+    )
 
     doctor: Optional["Doctor"] = Relationship(back_populates="user")
     nurse: Optional["Nurse"] = Relationship(back_populates="user")
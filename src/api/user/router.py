@@ -1,40 +1,58 @@
-from fastapi import APIRouter, Depends
-from typing import Mapping
+from fastapi import APIRouter, Depends, Header, Response
+from typing import List, Mapping, Optional
 
 from src.api.deps import get_current_user
-from src.api.user.models import User
+from src.api.pagination import PageParams
+from src.api.principal import Principal
+from src.api.responses import FastJSONResponse
+from src.api.user.models import Doctor, UserRole
 from src.api.user.service import UserService
-from src.api.user.schema import UserUpdateInput
+from src.api.user.schema import (
+    UserPage,
+    UserUpdateInput,
+    user_page_serializer,
+)
 from src.api.user.dependency import get_user
 
 router = APIRouter()
 
 
-@router.get("/")
+@router.get("/", response_model=UserPage)
 async def read_users(
+    role: Optional[UserRole] = None,
+    page: PageParams = Depends(),
     user_service: UserService = Depends(),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
-    users = user_service.get_users()
-    return users
+    users, next_cursor = await user_service.get_users(page, role)
+    return user_page_serializer.response(
+        {"users": users, "next_cursor": next_cursor}
+    )
 
 
 @router.get("/doctors")
 async def read_doctors(
+    status: Optional[str] = None,
+    page: PageParams = Depends(),
     user_service: UserService = Depends(),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
-    doctors = user_service.get_all_doctors()
-    return doctors
+    doctors, next_cursor = await user_service.get_all_doctors(page, status)
+    return {"doctors": doctors, "next_cursor": next_cursor}
 
 
-@router.get("/active-doctors")
+@router.get("/active-doctors", response_model=List[Doctor])
 async def read_active_doctors(
+    if_none_match: Optional[str] = Header(None),
     user_service: UserService = Depends(),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
-    doctors = user_service.get_active_doctors()
-    return doctors
+    snapshot = await user_service.get_active_doctors()
+    headers = {"ETag": snapshot.active_etag}
+    # Polling clients that send the ETag back get an empty 304
+    if if_none_match == snapshot.active_etag:
+        return Response(status_code=304, headers=headers)
+    return FastJSONResponse(snapshot.active_body, headers=headers)
 
 
 @router.get("/{user_id}")
@@ -42,9 +60,9 @@ async def read_user(
     user_id: int,
     user_service: UserService = Depends(),
     user: Mapping = Depends(get_user),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
-    user = user_service.get_user(user_id)
+    user = await user_service.get_user(user_id)
     return user
 
 
@@ -54,9 +72,9 @@ async def update_user(
     user_update_input: UserUpdateInput,
     user_service: UserService = Depends(),
     user: Mapping = Depends(get_user),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
-    user = user_service.update_user(user_id, user_update_input)
+    user = await user_service.update_user(user_id, user_update_input)
     return user
 
 
@@ -64,7 +82,7 @@ async def update_user(
 async def delete_user(
     user_id: int,
     user_service: UserService = Depends(),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
-    user = user_service.delete(user_id)
+    user = await user_service.delete_user(user_id)
     return user
@@ -1,7 +1,31 @@
+from datetime import datetime
+from typing import List, Optional
+from uuid import UUID
+
 from pydantic import BaseModel
+from typing_extensions import TypedDict
+
+from src.api.responses import Serializer
+from src.api.user.models import UserRole
 
 
 class UserUpdateInput(BaseModel):
     name: str
     email: str
     password: str
+
+
+class UserSummary(TypedDict):
+    id: UUID
+    created_at: datetime
+    username: str
+    email: str
+    role: UserRole
+
+
+class UserPage(TypedDict):
+    users: List[UserSummary]
+    next_cursor: Optional[str]
+
+
+user_page_serializer = Serializer(UserPage)
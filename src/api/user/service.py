@@ -1,49 +1,79 @@
+from typing import Optional
 from fastapi import Depends
-from src.core.database import get_session
-from src.api.user.models import Doctor, User
-from sqlmodel import select, Session
+from src.core.database import get_read_session, get_session
+from src.api.pagination import PageParams, page_of, paginate
+from src.api.principal import principal_cache
+from src.api.user.directory import DirectorySnapshot, doctor_directory
+from src.api.user.models import User, UserRole
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from src.api.user.schema import UserUpdateInput
 
+# Only what the user list shows, never the password hash or OTP columns
+USER_SUMMARY_COLUMNS = (
+    User.id,
+    User.created_at,
+    User.username,
+    User.email,
+    User.role,
+)
+
 
 class UserService:
-    def __init__(self, session: Session = Depends(get_session)) -> None:
+    def __init__(
+        self,
+        session: AsyncSession = Depends(get_session),
+        read_session: AsyncSession = Depends(get_read_session),
+    ) -> None:
         self.session = session
+        # Replica session for reads that do not follow a write
+        self.read_session = read_session
 
-    def get_users(self):
-        statement = select(User)
-        users = self.session.exec(statement).all()
-        return users
+    async def get_users(self, page: PageParams, role: Optional[UserRole]):
+        columns = (User.created_at, User.id)
+        # Plain rows, nothing is added to the session's identity map
+        statement = select(*USER_SUMMARY_COLUMNS)
+        if role is not None:
+            statement = statement.where(User.role == role)
+        statement = paginate(statement, columns, page)
+        rows = (await self.read_session.exec(statement)).all()
+        rows, next_cursor = page_of(rows, columns, page)
+        return [row._asdict() for row in rows], next_cursor
 
-    def get_user(self, user_id: int):
+    async def get_user(self, user_id: int):
         statement = select(User).where(User.id == user_id)
-        user = self.session.exec(statement).one_or_none()
+        user = (await self.session.exec(statement)).one_or_none()
         if user is None:
             raise Exception("User not found")
         return user
 
-    def get_all_doctors(self):
-        statement = select(Doctor)
-        doctors = self.session.exec(statement).all()
-        return doctors
+    async def get_all_doctors(self, page: PageParams, status: Optional[str]):
+        # Served from the in-process directory, loaded from the primary
+        # so a reload never picks up a lagging replica
+        return await doctor_directory.page(self.session, page, status)
 
-    def get_active_doctors(self):
-        statement = select(Doctor).where(Doctor.status == "active")
-        doctors = self.session.exec(statement).all()
-        return doctors
+    async def get_active_doctors(self) -> DirectorySnapshot:
+        return await doctor_directory.snapshot(self.session)
 
-    def update_user(self, user_id: int, user_update_input: UserUpdateInput):
+    async def update_user(
+        self, user_id: int, user_update_input: UserUpdateInput
+    ):
         statement = select(User).where(User.id == user_id)
-        user = self.session.exec(statement).one()
+        user = (await self.session.exec(statement)).one()
         for key, value in user_update_input.dict().items():
             setattr(user, key, value)
         self.session.add(user)
-        self.session.commit()
-        self.session.refresh(user)
+        await self.session.commit()
+        await self.session.refresh(user)
+        await principal_cache.user_changed(user.id)
         return user
 
-    def delete_user(self, user_id):
+    async def delete_user(self, user_id):
         statement = select(User).where(User.id == user_id)
-        user = self.session.exec(statement).one()
-        self.session.delete(user)
-        self.session.commit()
+        user = (await self.session.exec(statement)).one()
+        await self.session.delete(user)
+        await self.session.commit()
+        await principal_cache.user_changed(user.id)
+        if user.role == UserRole.doctor:
+            await doctor_directory.changed()
         return user
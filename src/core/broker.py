@@ -0,0 +1,268 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from typing import Callable, Dict, List
+
+from sqlalchemy.engine import make_url
+
+from src.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[dict], None]
+Resync = Callable[[], None]
+
+
+class Broker:
+    """Pub/sub backend that fans a message out to every worker process"""
+
+    def __init__(self) -> None:
+        self.handlers: Dict[str, List[Handler]] = defaultdict(list)
+        self.resync_callbacks: List[Resync] = []
+        self.publish_errors = 0
+        self.reconnects = 0
+
+    # Each worker subscribes its handlers at import, before `start`
+    def subscribe(self, channel: str, handler: Handler) -> None:
+        self.handlers[channel].append(handler)
+
+    def on_resync(self, callback: Resync) -> None:
+        self.resync_callbacks.append(callback)
+
+    # Messages missed while reconnecting cannot be replayed, the caches
+    # drop whatever they may have missed instead
+    def resync(self) -> None:
+        self.reconnects += 1
+        for callback in self.resync_callbacks:
+            try:
+                callback()
+            except Exception:
+                logger.exception("Resync callback failed")
+
+    def dispatch(self, channel: str, message: dict) -> None:
+        for handler in self.handlers.get(channel, []):
+            try:
+                handler(message)
+            except Exception:
+                logger.exception("Handler failed for channel %s", channel)
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    # Called once the caller's transaction committed, so a failure is
+    # logged and counted, never raised
+    async def publish(
+        self, channel: str, message: dict, numbered: bool = False
+    ) -> None:
+        try:
+            # From a sequence every worker shares, so ids stay ordered
+            if numbered:
+                message = {**message, "id": await self._next_id(channel)}
+            await self._send(channel, message)
+        except Exception:
+            self.publish_errors += 1
+            logger.exception("Publish failed on channel %s", channel)
+
+    async def _send(self, channel: str, message: dict) -> None:
+        raise NotImplementedError
+
+    async def _next_id(self, channel: str) -> int:
+        raise NotImplementedError
+
+    async def _wait_to_reconnect(self) -> None:
+        await asyncio.sleep(settings.BROKER_RECONNECT_DELAY)
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self).__name__,
+            "publish_errors": self.publish_errors,
+            "reconnects": self.reconnects,
+        }
+
+
+class InMemoryBroker(Broker):
+    """Single process stand-in, messages go straight to local handlers"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.sequences: Dict[str, int] = defaultdict(int)
+
+    async def _send(self, channel: str, message: dict) -> None:
+        self.dispatch(channel, message)
+
+    async def _next_id(self, channel: str) -> int:
+        self.sequences[channel] += 1
+        return self.sequences[channel]
+
+
+class RedisBroker(Broker):
+    """Redis pub/sub, needs the optional `redis` package"""
+
+    def __init__(self, url: str) -> None:
+        super().__init__()
+        self.url = url
+        self._client = None
+        self._listener = None
+
+    async def start(self) -> None:
+        from redis import asyncio as redis
+
+        self._client = redis.from_url(self.url)
+        # The first subscription fails startup, later ones are retried
+        pubsub = await self._subscribe()
+        self._listener = asyncio.create_task(self._listen_forever(pubsub))
+
+    async def _subscribe(self):
+        pubsub = self._client.pubsub()
+        await pubsub.subscribe(*self.handlers)
+        return pubsub
+
+    async def _listen_forever(self, pubsub) -> None:
+        while True:
+            try:
+                await self._listen(pubsub)
+                logger.warning("Redis subscription ended, reconnecting")
+            except Exception:
+                logger.exception("Redis subscription lost, reconnecting")
+            await self._close_quietly(pubsub)
+            pubsub = None
+            while pubsub is None:
+                await self._wait_to_reconnect()
+                try:
+                    pubsub = await self._subscribe()
+                except Exception:
+                    logger.warning("Redis still unreachable, retrying")
+            self.resync()
+
+    async def _listen(self, pubsub) -> None:
+        async for message in pubsub.listen():
+            if message["type"] != "message":
+                continue
+            channel = message["channel"].decode()
+            self.dispatch(channel, json.loads(message["data"]))
+
+    @staticmethod
+    async def _close_quietly(pubsub) -> None:
+        try:
+            await pubsub.aclose()
+        except Exception:
+            pass
+
+    async def stop(self) -> None:
+        if self._listener:
+            self._listener.cancel()
+        if self._client:
+            await self._client.aclose()
+
+    async def _send(self, channel: str, message: dict) -> None:
+        await self._client.publish(channel, json.dumps(message, default=str))
+
+    async def _next_id(self, channel: str) -> int:
+        return await self._client.incr(f"{channel}:id")
+
+
+class PostgresBroker(Broker):
+    """Postgres LISTEN/NOTIFY through asyncpg"""
+
+    def __init__(self, url: str) -> None:
+        super().__init__()
+        # asyncpg takes a plain libpq style DSN
+        self.dsn = (
+            make_url(url)
+            .set(drivername="postgresql")
+            .render_as_string(hide_password=False)
+        )
+        self._listen_conn = None
+        self._publish_conn = None
+        self._publish_lock = asyncio.Lock()
+        self._reconnector = None
+        self._stopping = False
+        # Sequences known to exist, created on first use
+        self._sequences = set()
+
+    async def _connect(self):
+        import asyncpg
+
+        return await asyncpg.connect(self.dsn)
+
+    async def start(self) -> None:
+        await self._listen()
+        self._publish_conn = await self._connect()
+
+    async def _listen(self) -> None:
+        conn = await self._connect()
+        conn.add_termination_listener(self._on_lost)
+        for channel in self.handlers:
+            await conn.add_listener(channel, self._on_notify)
+        self._listen_conn = conn
+
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        self.dispatch(channel, json.loads(payload))
+
+    def _on_lost(self, connection) -> None:
+        if self._stopping or connection is not self._listen_conn:
+            return
+        logger.warning("Postgres LISTEN connection lost, reconnecting")
+        self._reconnector = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self) -> None:
+        while True:
+            await self._wait_to_reconnect()
+            try:
+                await self._listen()
+            except Exception:
+                logger.warning("Postgres still unreachable, retrying")
+            else:
+                break
+        self.resync()
+
+    async def stop(self) -> None:
+        self._stopping = True
+        if self._reconnector:
+            self._reconnector.cancel()
+        for conn in (self._listen_conn, self._publish_conn):
+            if conn:
+                await conn.close()
+
+    async def _send(self, channel: str, message: dict) -> None:
+        payload = json.dumps(message, default=str)
+        # A single asyncpg connection can only run one query at a time
+        async with self._publish_lock:
+            if self._publish_conn is None or self._publish_conn.is_closed():
+                self._publish_conn = await self._connect()
+            await self._publish_conn.execute(
+                "SELECT pg_notify($1, $2)", channel, payload
+            )
+
+    async def _next_id(self, channel: str) -> int:
+        # Channel names are our own constants, safe to use as identifiers
+        sequence = f"{channel}_id"
+        async with self._publish_lock:
+            if self._publish_conn is None or self._publish_conn.is_closed():
+                self._publish_conn = await self._connect()
+            if sequence not in self._sequences:
+                await self._publish_conn.execute(
+                    f"CREATE SEQUENCE IF NOT EXISTS {sequence}"
+                )
+                self._sequences.add(sequence)
+            return await self._publish_conn.fetchval(
+                "SELECT nextval($1::text::regclass)", sequence
+            )
+
+
+def create_broker(url: str) -> Broker:
+    backend = url.split("://", 1)[0]
+    if backend == "memory":
+        return InMemoryBroker()
+    if backend in ("redis", "rediss"):
+        return RedisBroker(url)
+    if backend.startswith("postgresql"):
+        return PostgresBroker(url)
+    raise ValueError(f"Unsupported BROKER_URL backend: {backend}")
+
+
+broker = create_broker(settings.BROKER_URL)
@@ -1,12 +1,43 @@
+from typing import List
+
 from pydantic_settings import BaseSettings
 
 
 class Settings(BaseSettings):
     ENV: str = "development"
     DATABASE_URL: str = "sqlite:///./test.db"
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # Read replicas, a JSON list in the environment
+    DATABASE_REPLICA_URLS: List[str] = []
+    DB_REPLICA_CHECK_INTERVAL: int = 10
+    SLOW_QUERY_MS: int = 500
     SECRET_KEY: str = "your-secret-key"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
+    AUTH_CACHE_SIZE: int = 10000
+    AUTH_CACHE_TTL: int = 300
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_QUEUE_SIZE: int = 32
+    IDEMPOTENCY_CACHE_SIZE: int = 10000
+    IDEMPOTENCY_TTL: int = 86400
+    VITALS_BATCH_MAX_SIZE: int = 5000
+    APPOINTMENT_SLOT_MINUTES: int = 20
+    APPOINTMENT_MAX_DURATION_MINUTES: int = 240
+    AUTO_ASSIGN_BATCH_MAX_SIZE: int = 1000
+    WORKLOAD_RESYNC_SECONDS: int = 300
+    TRIAGE_AGING_MINUTES: int = 30
+    TRIAGE_RESYNC_SECONDS: int = 300
+    SSE_PING_INTERVAL: int = 15
+    SSE_QUEUE_SIZE: int = 100
+    SSE_CLIENT_IDLE_TIMEOUT: int = 120
+    SSE_REPLAY_BUFFER_SIZE: int = 500
+    # memory:// for a single worker, redis:// or postgresql:// otherwise
+    BROKER_URL: str = "memory://"
+    BROKER_RECONNECT_DELAY: float = 1
     SMTP_USER: str
     SMTP_PASSWORD: str
     SMTP_PORT: int
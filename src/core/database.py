@@ -1,15 +1,50 @@
-from sqlmodel import create_engine, Session
+import asyncio
+import itertools
+import logging
+import time
+from typing import List, Optional
+
+from fastapi import Depends
+from sqlalchemy import event, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlmodel import create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 from src.core.config import settings
+from src.core.pool import InstrumentedPool
 from sqlalchemy.exc import OperationalError
 import psycopg2
 
+logger = logging.getLogger(__name__)
+
 DATABASE_URL = settings.DATABASE_URL
 
+# Async drivers used in place of the sync ones named in DATABASE_URL
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def get_async_url(url: str):
+    """Swap the driver in a sync database URL for its asyncio driver"""
+    url = make_url(url)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        return url
+    return url.set(drivername=driver)
+
+
 engine = create_engine(DATABASE_URL)
 
 try:
-    engine.connect()
-    print("✅ Database exists!")
+    with engine.connect():
+        print("✅ Database exists!")
 except OperationalError:
     print("⚠️ Database does not exist. Creating it now...")
 
@@ -31,6 +66,141 @@ except OperationalError:
     engine = create_engine(DATABASE_URL)
 
 
-def get_session():
-    with Session(engine) as session:
+def get_engine_options(url, instrumented: bool = True) -> dict:
+    """Pool settings for the async engines, taken from Settings"""
+    options = {
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+    }
+    # In-memory SQLite is bound to a single connection, leave its pool alone
+    if url.get_backend_name() == "sqlite" and url.database in (
+        None,
+        "",
+        ":memory:",
+    ):
+        return options
+    if instrumented:
+        options.update(poolclass=InstrumentedPool)
+    options.update(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+    )
+    return options
+
+
+ASYNC_DATABASE_URL = get_async_url(DATABASE_URL)
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL, **get_engine_options(ASYNC_DATABASE_URL)
+)
+
+
+@event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+def start_query_timer(conn, cursor, statement, parameters, context, many):
+    # A connection runs one statement at a time
+    conn.info["query_start"] = time.perf_counter()
+
+
+@event.listens_for(async_engine.sync_engine, "after_cursor_execute")
+def log_slow_query(conn, cursor, statement, parameters, context, many):
+    elapsed = (time.perf_counter() - conn.info.pop("query_start")) * 1000
+    if elapsed >= settings.SLOW_QUERY_MS:
+        logger.warning("Slow query (%.1f ms): %s", elapsed, statement)
+
+
+def upsert(table):
+    """INSERT supporting ON CONFLICT for the configured database"""
+    if async_engine.dialect.name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
+
+# Objects stay loaded after commit so they can be returned from the
+# request without triggering a lazy refresh outside of the event loop.
+async_session = async_sessionmaker(
+    async_engine, class_=AsyncSession, expire_on_commit=False
+)
+
+
+async def get_session():
+    async with async_session() as session:
+        yield session
+
+
+class ReplicaSet:
+    """Read replicas chosen round-robin among the healthy ones"""
+
+    def __init__(self, urls: List[str]) -> None:
+        self.engines = []
+        for url in urls:
+            url = get_async_url(url)
+            # Replicas keep their own pools out of the primary's metrics
+            self.engines.append(
+                create_async_engine(
+                    url, **get_engine_options(url, instrumented=False)
+                )
+            )
+        self.healthy = [True] * len(self.engines)
+        self._turns = itertools.count()
+        self._checker = None
+
+    def choose(self) -> Optional[AsyncEngine]:
+        for _ in range(len(self.engines)):
+            index = next(self._turns) % len(self.engines)
+            if self.healthy[index]:
+                return self.engines[index]
+        return None
+
+    async def check(self) -> None:
+        for index, engine in enumerate(self.engines):
+            try:
+                async with engine.connect() as conn:
+                    await conn.execute(text("SELECT 1"))
+            except Exception:
+                if self.healthy[index]:
+                    logger.warning("Replica %s is down", engine.url)
+                self.healthy[index] = False
+            else:
+                if not self.healthy[index]:
+                    logger.warning("Replica %s is back up", engine.url)
+                self.healthy[index] = True
+
+    async def _check_forever(self) -> None:
+        while True:
+            await self.check()
+            await asyncio.sleep(settings.DB_REPLICA_CHECK_INTERVAL)
+
+    async def start(self) -> None:
+        if self.engines:
+            self._checker = asyncio.create_task(self._check_forever())
+
+    async def stop(self) -> None:
+        if self._checker:
+            self._checker.cancel()
+        for engine in self.engines:
+            await engine.dispose()
+
+    def stats(self) -> list:
+        return [
+            {"url": str(engine.url), "healthy": healthy}
+            for engine, healthy in zip(self.engines, self.healthy)
+        ]
+
+
+replicas = ReplicaSet(settings.DATABASE_REPLICA_URLS)
+
+
+async def get_read_session(session: AsyncSession = Depends(get_session)):
+    """Session for read-only queries, on a replica when one is healthy.
+
+    Without one this is the request's primary session itself. Anything
+    read back right after a write in the same request has to use the
+    primary session, a replica may lag behind.
+    """
+    engine = replicas.choose()
+    if engine is None:
         yield session
+        return
+    async with async_session(bind=engine) as read_session:
+        yield read_session
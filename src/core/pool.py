@@ -0,0 +1,73 @@
+import time
+from threading import Lock
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+
+class PoolMetrics:
+    """Counters describing how requests wait on the connection pool"""
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self.checkouts = 0
+        self.overflow_events = 0
+        self.timeouts = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def record_checkout(self, wait_time: float, overflowed: bool) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.wait_time_total += wait_time
+            self.wait_time_max = max(self.wait_time_max, wait_time)
+            if overflowed:
+                self.overflow_events += 1
+
+    def record_timeout(self, wait_time: float) -> None:
+        with self._lock:
+            self.timeouts += 1
+            self.wait_time_total += wait_time
+            self.wait_time_max = max(self.wait_time_max, wait_time)
+
+    def snapshot(self, pool) -> dict:
+        with self._lock:
+            waits = self.checkouts + self.timeouts
+            metrics = {
+                "checkouts": self.checkouts,
+                "overflow_events": self.overflow_events,
+                "timeouts": self.timeouts,
+                "wait_time_avg_ms": (
+                    self.wait_time_total / waits * 1000 if waits else 0.0
+                ),
+                "wait_time_max_ms": self.wait_time_max * 1000,
+            }
+        # Only queue pools have a size to report on
+        if isinstance(pool, QueuePool):
+            metrics.update(
+                pool_size=pool.size(),
+                checked_out=pool.checkedout(),
+                checked_in=pool.checkedin(),
+                overflow=max(pool.overflow(), 0),
+            )
+        return metrics
+
+
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Queue pool that reports checkout wait time and overflow usage"""
+
+    def connect(self):
+        start = time.perf_counter()
+        overflow = self.overflow()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            pool_metrics.record_timeout(time.perf_counter() - start)
+            raise
+        # overflow() only goes above zero once pool_size is exhausted
+        overflowed = self.overflow() > max(overflow, 0)
+        pool_metrics.record_checkout(time.perf_counter() - start, overflowed)
+        return connection
@@ -0,0 +1,71 @@
+import asyncio
+import time
+from typing import Optional
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+
+class SyncedIndex:
+    """In-process index seeded from the database, kept current by broker
+    messages and seeded again every `resync_seconds`"""
+
+    def __init__(self) -> None:
+        self.loaded_at: Optional[float] = None
+        self.reloads = 0
+        self._loading: Optional[list] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def resync_seconds(self) -> float:
+        raise NotImplementedError
+
+    async def _query(self, session: AsyncSession) -> list:
+        raise NotImplementedError
+
+    def _seed(self, rows: list) -> None:
+        raise NotImplementedError
+
+    def _apply(self, message: dict) -> None:
+        raise NotImplementedError
+
+    async def ready(self, session: AsyncSession) -> None:
+        if self._expired():
+            async with self._lock:
+                if self._expired():
+                    await self._load(session)
+
+    def _expired(self) -> bool:
+        return (
+            self.loaded_at is None
+            or time.monotonic() - self.loaded_at > self.resync_seconds
+        )
+
+    async def _load(self, session: AsyncSession) -> None:
+        # Messages that arrive during the query are applied again on top
+        self._loading = []
+        try:
+            rows = await self._query(session)
+        except BaseException:
+            self._loading = None
+            raise
+        missed, self._loading = self._loading, None
+        self._seed(rows)
+        for message in missed:
+            self._apply(message)
+        self.loaded_at = time.monotonic()
+        self.reloads += 1
+
+    def apply(self, message: dict) -> None:
+        """Broker handler"""
+        if self._loading is not None:
+            self._loading.append(message)
+        self._apply(message)
+
+    def invalidate(self) -> None:
+        self.loaded_at = None
+
+    @staticmethod
+    def outgrown(heap: list, live: int) -> bool:
+        """Whether a heap whose outdated entries are dropped lazily, when
+        they reach the top, should be rebuilt"""
+        return len(heap) > 2 * live + 64
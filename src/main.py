@@ -5,7 +5,10 @@ from src.api.user.router import router as user_router
 from src.api.auth.router import router as auth_router
 from src.api.appointment.router import router as appointment_router
 from src.api.ehr.router import router as ehr_router
+from src.api.metrics.router import router as metrics_router
 from src.api.sse.service import setup_sse_routes
+from src.core.broker import broker
+from src.core.database import replicas
 
 
 app = FastAPI()
@@ -24,10 +27,17 @@ app.include_router(
 )
 app.include_router(user_router, prefix="/users", tags=["users"])
 app.include_router(ehr_router, prefix="/ehr", tags=["ehr"])
+app.include_router(metrics_router, prefix="/metrics", tags=["metrics"])
 
 # Setup SSE routes
 setup_sse_routes(app)
 
+# Connect the cross-worker broker once handlers are subscribed
+app.add_event_handler("startup", broker.start)
+app.add_event_handler("shutdown", broker.stop)
+app.add_event_handler("startup", replicas.start)
+app.add_event_handler("shutdown", replicas.stop)
+
 
 @app.get("/")
 async def root():
@@ -0,0 +1,215 @@
+import os
+import random
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+
+# Settings are read at import, so point them at a throwaway database first.
+# TEST_DATABASE_URL runs the suite against another server, e.g. Postgres.
+_workdir = tempfile.mkdtemp(prefix="curasphere-tests-")
+os.environ["DATABASE_URL"] = os.environ.get(
+    "TEST_DATABASE_URL", f"sqlite:///{_workdir}/test.db"
+)
+for name, value in (
+    ("SMTP_USER", "tests"),
+    ("SMTP_PASSWORD", "tests"),
+    ("SMTP_PORT", "25"),
+    ("SMTP_HOST", "localhost"),
+    ("SMTP_TLS", "false"),
+    ("EMAILS_FROM_EMAIL", "tests@example.com"),
+):
+    os.environ.setdefault(name, value)
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event, insert, text  # noqa: E402
+from sqlmodel import SQLModel  # noqa: E402
+
+from src.main import app  # noqa: E402
+from src.api.appointment.model import (  # noqa: E402
+    Appointment,
+    AppointmentStatus,
+    UrgencyLevel,
+)
+from src.api.auth.hashing import pwd_context  # noqa: E402
+from src.api.ehr.model import EHR  # noqa: E402
+from src.api.user.models import (  # noqa: E402
+    Doctor,
+    GenderEnum,
+    Nurse,
+    Patient,
+    User,
+    UserRole,
+)
+from src.core.database import async_engine, engine  # noqa: E402
+
+PASSWORD = "password"
+
+
+@pytest.fixture(scope="session")
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    SQLModel.metadata.drop_all(engine)
+    SQLModel.metadata.create_all(engine)
+    yield
+    engine.dispose()
+
+
+@pytest.fixture(scope="session")
+def client(schema):
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def statements():
+    """SQL statements run on the app's engine while the test runs.
+
+    Each item is a (statement, parameters) pair as sent to the driver.
+    """
+    captured = []
+
+    def record(conn, cursor, statement, parameters, context, many):
+        captured.append((statement, parameters))
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    yield captured
+    event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+
+
+@pytest.fixture
+def query_plan():
+    """Returns a coroutine giving the plan of a captured statement"""
+
+    async def explain(statement: str, parameters) -> str:
+        if async_engine.dialect.name == "sqlite":
+            prefix = "EXPLAIN QUERY PLAN "
+        else:
+            prefix = "EXPLAIN "
+        async with async_engine.connect() as conn:
+            result = await conn.exec_driver_sql(
+                prefix + statement, parameters
+            )
+            # The plan text is the last column on both SQLite and Postgres
+            return "\n".join(str(row[-1]) for row in result.all())
+
+    return explain
+
+
+class Dataset:
+    """Synthetic hospital inserted straight through Core for speed"""
+
+    def __init__(self, patients: int, doctors: int, appointments: int):
+        self.password = PASSWORD
+        self.password_hash = pwd_context.hash(PASSWORD)
+        self.users = []
+        self.patients = []
+        self.doctors = []
+        self.nurses = []
+        self.appointments = []
+        self.ehrs = []
+        for _ in range(patients):
+            self._person(UserRole.patient, self.patients)
+        for _ in range(doctors):
+            self._person(UserRole.doctor, self.doctors)
+        self._person(UserRole.nurse, self.nurses)
+
+        now = datetime.now()
+        for index in range(appointments):
+            scheduled = now + timedelta(
+                minutes=random.randint(-60 * 24 * 90, 60 * 24 * 30)
+            )
+            # History is mostly done, like a real queue
+            if scheduled < now - timedelta(days=1) and index % 20:
+                status = AppointmentStatus.COMPLETED
+            else:
+                status = random.choice(
+                    [AppointmentStatus.PENDING, AppointmentStatus.DIAGNOSED]
+                )
+            appointment = {
+                "id": uuid.uuid4(),
+                "patient_id": random.choice(self.patients)["id"],
+                "doctor_id": random.choice(self.doctors)["id"],
+                "scheduled_time": scheduled,
+                "duration_minutes": 20,
+                "status": status,
+                "urgency_level": UrgencyLevel.LOW,
+            }
+            self.appointments.append(appointment)
+            if status != AppointmentStatus.PENDING:
+                self.ehrs.append(
+                    {
+                        "patient_id": appointment["patient_id"],
+                        "doctor_id": appointment["doctor_id"],
+                        "appointment_id": appointment["id"],
+                        "status": status.value.lower(),
+                    }
+                )
+
+    def _person(self, role: UserRole, profiles: list) -> None:
+        user_id = uuid.uuid4()
+        name = f"{role.value}-{len(profiles)}"
+        self.users.append(
+            {
+                "id": user_id,
+                "username": name,
+                "email": f"{name}@example.com",
+                "role": role,
+                "hash": self.password_hash,
+            }
+        )
+        profile = {"id": uuid.uuid4(), "user_id": user_id, "full_name": name}
+        if role == UserRole.patient:
+            profile.update(
+                age=30,
+                hospital_card_id=name,
+                gender=GenderEnum.OTHER,
+                current_weight_kg=70,
+                current_height_cm=170,
+            )
+        profiles.append(profile)
+
+    def insert(self) -> None:
+        with engine.begin() as conn:
+            for model, rows in (
+                (User, self.users),
+                (Patient, self.patients),
+                (Doctor, self.doctors),
+                (Nurse, self.nurses),
+                (Appointment, self.appointments),
+                (EHR, self.ehrs),
+            ):
+                conn.execute(insert(model), rows)
+            # Planner statistics, as a long running database would have
+            conn.execute(text("ANALYZE"))
+
+
+@pytest.fixture(scope="session")
+def dataset(schema) -> Dataset:
+    data = Dataset(patients=2000, doctors=50, appointments=20000)
+    data.insert()
+    return data
+
+
+@pytest.fixture(scope="session")
+def login(client, dataset):
+    """Returns the auth headers of a dataset user, e.g. login("nurse-0")"""
+    tokens = {}
+
+    def headers(name: str) -> dict:
+        if name not in tokens:
+            response = client.post(
+                "/auth/login",
+                data={
+                    "username": f"{name}@example.com",
+                    "password": dataset.password,
+                },
+            )
+            tokens[name] = response.json()["access_token"]
+        return {"Authorization": f"Bearer {tokens[name]}"}
+
+    return headers
@@ -0,0 +1,87 @@
+import threading
+
+import anyio
+import pytest
+from fastapi import HTTPException
+
+from src.api.auth.hashing import PasswordHasher, password_hasher
+from src.api.auth.service import AuthService
+from src.core.database import async_session
+
+
+def registration(name: str) -> dict:
+    return {
+        "email": f"{name}@example.com",
+        "full_name": name,
+        "password": "password",
+        "id_number": name,
+        "age": 30,
+        "gender": "male",
+        "weight": 70,
+        "height": 170,
+        "hospital_card_id": name,
+    }
+
+
+def test_register_passes_busy_hasher_through(client, monkeypatch):
+    monkeypatch.setattr(password_hasher, "max_pending", 0)
+
+    response = client.post("/auth/register", json=registration("busy"))
+
+    assert response.status_code == 503, response.text
+    assert response.headers["Retry-After"] == "1"
+
+
+def test_register_rejects_duplicates_with_400(client):
+    assert (
+        client.post("/auth/register", json=registration("twice")).status_code
+        == 200
+    )
+
+    response = client.post("/auth/register", json=registration("twice"))
+
+    assert response.status_code == 400, response.text
+
+
+@pytest.mark.anyio
+async def test_cancelled_hash_keeps_its_slot_until_it_finishes():
+    hasher = PasswordHasher(workers=1, queue_size=0)
+    release = threading.Event()
+
+    try:
+        with anyio.move_on_after(0.1):
+            # Stands in for a bcrypt call whose client timed out
+            await hasher._run(release.wait)
+        with anyio.fail_after(1), pytest.raises(HTTPException) as busy:
+            await hasher._run(release.wait)
+        assert busy.value.status_code == 503
+    finally:
+        release.set()
+    with anyio.fail_after(5):
+        while hasher.pending:
+            await anyio.sleep(0.01)
+    assert await hasher._run(len, "free") == 4
+
+
+def test_password_reset_revokes_earlier_tokens(client):
+    email = registration("revoked")["email"]
+    client.post("/auth/register", json=registration("revoked"))
+
+    def log_in(password: str) -> dict:
+        response = client.post(
+            "/auth/login", data={"username": email, "password": password}
+        )
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    old = log_in("password")
+    assert client.get("/appointment/mine", headers=old).status_code == 200
+
+    async def reset() -> None:
+        async with async_session() as session:
+            await AuthService(session).reset_password(email, None, "changed")
+
+    client.portal.call(reset)
+
+    assert client.get("/appointment/mine", headers=old).status_code == 401
+    new = log_in("changed")
+    assert client.get("/appointment/mine", headers=new).status_code == 200
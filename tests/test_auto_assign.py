@@ -0,0 +1,99 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlmodel import select
+
+from src.api.appointment.model import Appointment
+from src.api.ehr.model import EHR
+from src.api.ehr.repository import EHRRepository
+from src.api.ehr.workload import workload_index
+from src.api.user.directory import doctor_directory
+from src.api.user.models import Doctor, User, UserRole
+from src.core.database import async_session
+
+pytestmark = pytest.mark.anyio
+
+
+async def add_doctor(session, dataset) -> uuid.UUID:
+    user = User(
+        username=f"auto-{uuid.uuid4()}",
+        email=f"auto-{uuid.uuid4()}@example.com",
+        role=UserRole.doctor,
+        hash=dataset.password_hash,
+    )
+    doctor = Doctor(user_id=user.id, full_name=user.username, status="active")
+    session.add_all([user, doctor])
+    return doctor.id
+
+
+async def add_visit(session, patient_id, when, doctor_id=None) -> uuid.UUID:
+    """A consultation whose vitals were recorded, waiting for a doctor"""
+    appointment = Appointment(
+        patient_id=patient_id, doctor_id=doctor_id, scheduled_time=when
+    )
+    session.add(appointment)
+    session.add(
+        EHR(
+            patient_id=patient_id,
+            appointment_id=appointment.id,
+            status="vitals_recorded",
+        )
+    )
+    return appointment.id
+
+
+@pytest.fixture(scope="module")
+async def doctors(dataset):
+    # Far from the dataset, the only active doctors in the directory
+    async with async_session() as session:
+        doctor_ids = [await add_doctor(session, dataset) for _ in range(2)]
+        await session.commit()
+    await doctor_directory.changed()
+    workload_index.invalidate()
+    return doctor_ids
+
+
+async def appointment_doctor(session, appointment_id):
+    statement = select(Appointment.doctor_id).where(
+        Appointment.id == appointment_id
+    )
+    return (await session.exec(statement)).one()
+
+
+async def test_auto_assign_passes_over_a_doctor_booked_then(doctors, dataset):
+    when = datetime.now() + timedelta(days=500)
+    patient_id = dataset.patients[0]["id"]
+    async with async_session() as session:
+        await workload_index.ready(session)
+        busy = workload_index.least_loaded()
+        await add_visit(session, patient_id, when, doctor_id=busy)
+        waiting = await add_visit(session, patient_id, when)
+        await session.commit()
+
+        ehr = await EHRRepository(session, session).auto_assign(waiting)
+
+    free = next(doctor_id for doctor_id in doctors if doctor_id != busy)
+    assert ehr.doctor_id == free
+
+
+async def test_backlog_keeps_booked_doctors_and_replans_clashes(
+    doctors, dataset
+):
+    when = datetime.now() + timedelta(days=600)
+    patient_id = dataset.patients[1]["id"]
+    async with async_session() as session:
+        booked = await add_visit(session, patient_id, when, doctors[0])
+        first = await add_visit(session, patient_id, when + timedelta(1))
+        second = await add_visit(session, patient_id, when + timedelta(1))
+        await session.commit()
+
+        assigned = await EHRRepository(session, session).auto_assign_backlog(
+            1000
+        )
+        doctor_of = {row[0]: row[2] for row in assigned}
+
+        assert booked not in doctor_of
+        assert await appointment_doctor(session, booked) == doctors[0]
+    # Both at the same time, so one had to move to the other doctor
+    assert {doctor_of[first], doctor_of[second]} == set(doctors)
@@ -0,0 +1,159 @@
+"""Throughput benchmarks on a single worker, run with: pytest -m slow -s
+
+Each one prints its numbers at several concurrency levels. Requests are
+sent in-process on the app's own event loop, as on one uvicorn worker. On
+SQLite the queries are too quick for the gap to show much, point
+TEST_DATABASE_URL at a Postgres server to measure with real latency.
+"""
+
+import time
+from collections import Counter
+from typing import Tuple
+
+import anyio
+import httpx
+import pytest
+from sqlmodel import Session, create_engine
+
+from src.api.auth.hashing import password_hasher
+from src.core.database import engine, get_read_session
+from src.main import app
+
+pytestmark = pytest.mark.slow
+
+CONCURRENCY = (1, 10, 50)
+REQUESTS = 200
+# Each login costs a bcrypt verification, a few hundred ms of CPU
+LOGIN_CONCURRENCY = (1, 8, 32, 64)
+LOGINS = 64
+PROBE_INTERVAL = 0.01
+
+
+class BlockingSession:
+    """The session layer before the async engine, every query blocks the
+    event loop until the database answers"""
+
+    def __init__(self, session: Session) -> None:
+        self._session = session
+
+    async def exec(self, statement):
+        return self._session.exec(statement)
+
+
+# Sessions hold their connection until the response is sent, a smaller
+# pool would stall the loop waiting for a connection only it can return
+blocking_engine = create_engine(
+    engine.url, pool_size=max(CONCURRENCY), max_overflow=0
+)
+
+
+def blocking_read_session():
+    # As get_session was, FastAPI runs it in its thread pool
+    with Session(blocking_engine) as session:
+        yield BlockingSession(session)
+
+
+def app_client() -> httpx.AsyncClient:
+    transport = httpx.ASGITransport(app=app)
+    return httpx.AsyncClient(transport=transport, base_url="http://test")
+
+
+async def throughput(
+    send, concurrency: int, total: int = REQUESTS
+) -> Tuple[float, Counter]:
+    """Requests per second and status codes of `total` calls to `send`,
+    `concurrency` at a time"""
+    statuses = Counter()
+    async with app_client() as client:
+
+        async def worker(count: int) -> None:
+            for _ in range(count):
+                statuses[(await send(client)).status_code] += 1
+
+        started = time.perf_counter()
+        async with anyio.create_task_group() as group:
+            for _ in range(concurrency):
+                group.start_soon(worker, total // concurrency)
+        elapsed = time.perf_counter() - started
+    return sum(statuses.values()) / elapsed, statuses
+
+
+def test_async_sessions_keep_serving_while_queries_run(client, login):
+    headers = login("patient-0")
+
+    async def list_appointments(http):
+        return await http.get("/appointment/mine", headers=headers)
+
+    print(f"\n{'concurrency':>12} {'blocking req/s':>15} {'async req/s':>12}")
+    for concurrency in CONCURRENCY:
+        app.dependency_overrides[get_read_session] = blocking_read_session
+        try:
+            before, statuses = client.portal.call(
+                throughput, list_appointments, concurrency
+            )
+        finally:
+            app.dependency_overrides.pop(get_read_session)
+        assert set(statuses) == {200}
+        after, statuses = client.portal.call(
+            throughput, list_appointments, concurrency
+        )
+        assert set(statuses) == {200}
+        print(f"{concurrency:>12} {before:>15.0f} {after:>12.0f}")
+
+
+async def login_storm(credentials: dict, concurrency: int) -> tuple:
+    """Login throughput, status codes and the longest the event loop was
+    stuck while the logins ran"""
+    stuck = 0.0
+    done = anyio.Event()
+
+    async def log_in(http):
+        return await http.post("/auth/login", data=credentials)
+
+    async def probe(http) -> None:
+        nonlocal stuck
+        while not done.is_set():
+            started = time.perf_counter()
+            await http.get("/docs")
+            await anyio.sleep(PROBE_INTERVAL)
+            # Anything past the interval is time the event loop was stuck
+            elapsed = time.perf_counter() - started - PROBE_INTERVAL
+            stuck = max(stuck, elapsed)
+
+    async with app_client() as http:
+        async with anyio.create_task_group() as group:
+            group.start_soon(probe, http)
+            rate, statuses = await throughput(log_in, concurrency, LOGINS)
+            done.set()
+    return rate, statuses, stuck
+
+
+def test_login_throughput_with_the_hashing_pool(client, dataset, monkeypatch):
+    credentials = {
+        "username": "nurse-0@example.com",
+        "password": dataset.password,
+    }
+
+    async def inline(func, *args):
+        # As verify_password was, bcrypt on the event loop
+        return func(*args)
+
+    print(
+        f"\n{'concurrency':>12} {'inline/s':>9} {'pool/s':>7} {'503s':>5}"
+        f" {'inline stall ms':>16} {'pool stall ms':>14}"
+    )
+    for concurrency in LOGIN_CONCURRENCY:
+        with monkeypatch.context() as patch:
+            patch.setattr(password_hasher, "_run", inline)
+            before, _, before_stall = client.portal.call(
+                login_storm, credentials, concurrency
+            )
+        after, statuses, after_stall = client.portal.call(
+            login_storm, credentials, concurrency
+        )
+        assert set(statuses) <= {200, 503}
+        print(
+            f"{concurrency:>12} {before:>9.1f} {after:>7.1f}"
+            f" {statuses[503]:>5} {before_stall * 1000:>16.0f}"
+            f" {after_stall * 1000:>14.0f}"
+        )
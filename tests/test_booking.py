@@ -0,0 +1,108 @@
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from src.api.appointment.model import (
+    Appointment,
+    AppointmentStatus,
+    AppointmentType,
+    UrgencyLevel,
+)
+from src.api.appointment.repository import AppointmentRepository, claim_slots
+from src.api.ehr.model import EHR
+from src.api.ehr.repository import EHRRepository
+from src.core.database import async_session
+
+pytestmark = pytest.mark.anyio
+
+
+def booked(dataset):
+    """A booked appointment with no other one of its doctor nearby"""
+    near = timedelta(hours=2)
+    return next(
+        appointment
+        for appointment in dataset.appointments
+        if appointment["status"] != AppointmentStatus.CANCELED
+        and not any(
+            other["doctor_id"] == appointment["doctor_id"]
+            and other["id"] != appointment["id"]
+            and abs(other["scheduled_time"] - appointment["scheduled_time"])
+            < near
+            for other in dataset.appointments
+        )
+    )
+
+
+async def test_claim_slots_finds_overlaps_and_ignores_the_moved_booking(
+    dataset,
+):
+    appointment = booked(dataset)
+    doctor_id = appointment["doctor_id"]
+    start = appointment["scheduled_time"]
+    later = start + timedelta(days=400)
+    bookings = [
+        # The same appointment, moved by five minutes
+        (appointment["id"], doctor_id, start + timedelta(minutes=5), 20),
+        (uuid.uuid4(), doctor_id, start + timedelta(minutes=10), 20),
+        (uuid.uuid4(), doctor_id, later, 20),
+        (uuid.uuid4(), doctor_id, later + timedelta(minutes=15), 20),
+    ]
+    async with async_session() as session:
+        taken = await claim_slots(session, bookings)
+
+    assert taken == [bookings[1][0], bookings[3][0]]
+
+
+async def test_rescheduling_onto_a_booked_slot_is_refused(dataset):
+    appointment = booked(dataset)
+    other = next(
+        other
+        for other in dataset.appointments
+        if other["doctor_id"] == appointment["doctor_id"]
+        and other["id"] != appointment["id"]
+        and other["status"] != AppointmentStatus.CANCELED
+    )
+    moved = other["scheduled_time"] + timedelta(minutes=5)
+    data = SimpleNamespace(
+        appointment_date=moved.strftime("%Y-%m-%d"),
+        appointment_time=moved.strftime("%H:%M"),
+    )
+    async with async_session() as session:
+        repository = AppointmentRepository(session, session)
+        with pytest.raises(HTTPException) as refused:
+            await repository.update(
+                appointment["patient_id"], appointment["id"], data
+            )
+
+    assert refused.value.status_code == 409
+
+
+async def test_a_doctor_can_take_overlapping_emergencies(dataset):
+    doctor_id = dataset.doctors[0]["id"]
+    async with async_session() as session:
+        emergencies = []
+        for patient in dataset.patients[:2]:
+            emergency = Appointment(
+                patient_id=patient["id"],
+                scheduled_time=datetime.now(),
+                type=AppointmentType.EMERGENCY,
+                urgency_level=UrgencyLevel.HIGH,
+            )
+            session.add(emergency)
+            session.add(
+                EHR(
+                    patient_id=patient["id"],
+                    appointment_id=emergency.id,
+                    status="vitals_recorded",
+                )
+            )
+            emergencies.append(emergency.id)
+        await session.commit()
+
+        repository = EHRRepository(session, session)
+        for appointment_id in emergencies:
+            ehr = await repository.assign_doctor(doctor_id, appointment_id)
+            assert ehr.doctor_id == doctor_id
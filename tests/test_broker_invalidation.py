@@ -0,0 +1,123 @@
+import asyncio
+import json
+import uuid
+
+import pytest
+
+from src.api.appointment.triage import triage_index
+from src.api.ehr.workload import workload_index
+from src.api.principal import PRINCIPAL_CHANNEL, principal_cache
+from src.core.broker import InMemoryBroker, RedisBroker, broker
+from src.core.config import settings
+
+
+class FailingBroker(InMemoryBroker):
+    async def _send(self, channel: str, message: dict) -> None:
+        raise ConnectionError("broker down")
+
+
+class FakeRedis:
+    """The commands publish needs, on a server two workers share"""
+
+    def __init__(self):
+        self.counters = {}
+        self.published = []
+
+    async def incr(self, key: str) -> int:
+        self.counters[key] = self.counters.get(key, 0) + 1
+        return self.counters[key]
+
+    async def publish(self, channel: str, payload: str) -> None:
+        self.published.append(json.loads(payload))
+
+
+class FakePubSub:
+    """Redis pubsub that drops after its messages, or waits for more"""
+
+    def __init__(self, messages, drop: bool):
+        self.messages = messages
+        self.drop = drop
+
+    async def listen(self):
+        for message in self.messages:
+            yield message
+        if self.drop:
+            raise ConnectionError("connection reset")
+        await asyncio.Event().wait()
+
+    async def aclose(self) -> None:
+        pass
+
+
+def test_principal_cache_drops_users_changed_on_other_workers():
+    changed, kept = uuid.uuid4(), uuid.uuid4()
+    principal_cache.set((changed, "token"), "changed")
+    principal_cache.set((kept, "token"), "kept")
+
+    # What another worker's user_changed publishes
+    broker.dispatch(PRINCIPAL_CHANNEL, {"user_id": str(changed)})
+
+    assert principal_cache.get((changed, "token")) is None
+    assert principal_cache.get((kept, "token")) == "kept"
+
+
+@pytest.mark.anyio
+async def test_failed_publish_is_logged_not_raised():
+    failing = FailingBroker()
+
+    await failing.publish("channel", {"id": 1})
+
+    assert failing.stats()["publish_errors"] == 1
+
+
+def test_resync_drops_what_the_caches_may_have_missed():
+    principal_cache.set((uuid.uuid4(), "token"), "cached")
+    workload_index.loaded_at = triage_index.loaded_at = 0.0
+
+    broker.resync()
+
+    assert principal_cache.stats()["size"] == 0
+    assert workload_index.loaded_at is None
+    assert triage_index.loaded_at is None
+
+
+@pytest.mark.anyio
+async def test_redis_listener_resubscribes_and_resyncs(monkeypatch):
+    monkeypatch.setattr(settings, "BROKER_RECONNECT_DELAY", 0)
+    redis = RedisBroker("redis://localhost")
+    received, resynced = [], asyncio.Event()
+    redis.subscribe("channel", received.append)
+    redis.on_resync(resynced.set)
+    message = {"type": "message", "channel": b"channel", "data": b"{}"}
+    attempts = iter([ConnectionError("refused"), FakePubSub([], False)])
+
+    async def subscribe():
+        result = next(attempts)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    redis._subscribe = subscribe
+    listener = asyncio.create_task(
+        redis._listen_forever(FakePubSub([message], True))
+    )
+    try:
+        await asyncio.wait_for(resynced.wait(), timeout=5)
+    finally:
+        listener.cancel()
+
+    assert received == [{}]
+    assert redis.stats()["reconnects"] == 1
+
+
+@pytest.mark.anyio
+async def test_numbered_messages_are_ordered_across_workers():
+    server = FakeRedis()
+    workers = [RedisBroker("redis://localhost") for _ in range(2)]
+    for worker in workers:
+        worker._client = server
+
+    for worker in [*workers, *workers]:
+        await worker.publish("channel", {"data": "{}"}, numbered=True)
+
+    assert [message["id"] for message in server.published] == [1, 2, 3, 4]
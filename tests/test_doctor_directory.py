@@ -0,0 +1,24 @@
+import pytest
+
+from src.api.pagination import PageParams
+from src.api.user.directory import DoctorDirectory
+from src.core.database import async_session
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_snapshot_survives_a_rollback_of_its_session(dataset):
+    directory = DoctorDirectory()
+    async with async_session() as session:
+        snapshot = await directory.snapshot(session)
+        # As when a request loads a cold snapshot and then fails
+        await session.rollback()
+        doctors, _ = await directory.page(
+            session, PageParams(limit=10, cursor=None), None
+        )
+
+    names = {doctor["full_name"] for doctor in dataset.doctors}
+    assert names <= {doctor.full_name for doctor in snapshot.doctors}
+    assert [doctor.model_dump()["id"] for doctor in doctors] == [
+        doctor.id for doctor in snapshot.doctors[:10]
+    ]
@@ -0,0 +1,63 @@
+from collections import Counter
+
+import pytest
+
+from src.api.appointment.repository import AppointmentRepository
+from src.api.appointment.schema import AppointmentFilters
+from src.api.pagination import PageParams
+from src.core.database import async_session
+
+pytestmark = pytest.mark.anyio
+
+NO_FILTERS = dict(
+    status=None, type=None, scheduled_from=None, scheduled_to=None
+)
+
+
+def page(limit: int) -> PageParams:
+    return PageParams(limit=limit, cursor=None)
+
+
+async def count_statements(statements, call) -> tuple:
+    statements.clear()
+    rows, _ = await call()
+    return len(rows), len(statements)
+
+
+@pytest.mark.parametrize("method", ["list", "nurse_list_all"])
+async def test_appointment_lists_do_not_query_per_row(
+    dataset, statements, method
+):
+    bookings = Counter(a["patient_id"] for a in dataset.appointments)
+    patient_id = bookings.most_common(1)[0][0]
+    async with async_session() as session:
+        repository = AppointmentRepository(session, session)
+        filters = AppointmentFilters(**NO_FILTERS)
+        args = (patient_id,) if method == "list" else ()
+        call = getattr(repository, method)
+        few = await count_statements(
+            statements, lambda: call(*args, page(2), filters)
+        )
+        many = await count_statements(
+            statements, lambda: call(*args, page(20), filters)
+        )
+
+    assert few[0] < many[0]
+    assert few[1] == many[1] == 1
+
+
+@pytest.mark.parametrize("role", ["doctors", "nurses", "patients"])
+def test_login_needs_at_most_two_statements(
+    client, dataset, statements, role
+):
+    # A doctor's first login also flips them to active, the worst case
+    user_id = getattr(dataset, role)[0]["user_id"]
+    email = next(u["email"] for u in dataset.users if u["id"] == user_id)
+
+    statements.clear()
+    response = client.post(
+        "/auth/login", data={"username": email, "password": dataset.password}
+    )
+
+    assert response.status_code == 200, response.text
+    assert len(statements) <= 2, [s for s, _ in statements]
@@ -0,0 +1,94 @@
+import re
+
+import pytest
+
+from src.api.appointment.repository import AppointmentRepository
+from src.api.appointment.schema import AppointmentFilters
+from src.api.ehr.repository import EHRRepository
+from src.api.pagination import PageParams
+from src.core.database import async_session
+
+pytestmark = pytest.mark.anyio
+
+NO_FILTERS = dict(
+    status=None, type=None, scheduled_from=None, scheduled_to=None
+)
+
+
+def full_scans(plan: str, table: str) -> bool:
+    """Whether the plan reads every row of the table"""
+    sqlite = re.search(rf"\bSCAN {table}\b", plan)
+    postgres = re.search(rf"\bSeq Scan on {table}\b", plan)
+    return bool(sqlite or postgres)
+
+
+async def test_nurse_queue_uses_open_queue_index(
+    dataset, statements, query_plan
+):
+    async with async_session() as session:
+        repository = AppointmentRepository(session, session)
+        await repository.nurse_list_all(
+            PageParams(limit=50, cursor=None),
+            AppointmentFilters(**NO_FILTERS),
+        )
+
+    assert len(statements) == 1
+    plan = await query_plan(*statements[0])
+    assert "ix_appointment_open_status_scheduled_time" in plan, plan
+    assert not full_scans(plan, "appointment"), plan
+
+
+def appointment_lookups(dataset):
+    appointment = next(
+        a for a in dataset.appointments if a["status"] != "PENDING"
+    )
+    patient_id = appointment["patient_id"]
+    doctor_id = appointment["doctor_id"]
+    page = PageParams(limit=50, cursor=None)
+    return {
+        "get": lambda appointments, ehrs: appointments.get(
+            patient_id, appointment["id"]
+        ),
+        "list": lambda appointments, ehrs: appointments.list(
+            patient_id, page, AppointmentFilters(**NO_FILTERS)
+        ),
+        "get_by_appointment": lambda appointments, ehrs: (
+            ehrs.get_by_appointment(appointment["id"])
+        ),
+        "get_doctor_records": lambda appointments, ehrs: (
+            ehrs.get_doctor_records(doctor_id, page, None)
+        ),
+        "get_pending_for_doctor": lambda appointments, ehrs: (
+            ehrs.get_pending_for_doctor(doctor_id)
+        ),
+    }
+
+
+# Index the main statement of each lookup has to use, any for a PK lookup
+MAIN_INDEXES = {
+    "get": None,
+    "list": "ix_appointment_patient_id_scheduled_time",
+    "get_by_appointment": "ix_ehr_appointment_id",
+    "get_doctor_records": "ix_ehr_doctor_id_id",
+    "get_pending_for_doctor": "ix_appointment_doctor_id_scheduled_time",
+}
+
+
+@pytest.mark.parametrize("method", list(MAIN_INDEXES))
+async def test_lookups_use_indexes(dataset, statements, query_plan, method):
+    call = appointment_lookups(dataset)[method]
+    async with async_session() as session:
+        await call(
+            AppointmentRepository(session, session),
+            EHRRepository(session, session),
+        )
+
+    assert statements
+    plans = [await query_plan(*statement) for statement in list(statements)]
+    if MAIN_INDEXES[method]:
+        assert MAIN_INDEXES[method] in plans[0], plans[0]
+    # Eager loads come as further statements, each one keyed on an index
+    for plan in plans:
+        assert "INDEX" in plan.upper(), plan
+        for table in ("appointment", "ehr"):
+            assert not full_scans(plan, table), plan
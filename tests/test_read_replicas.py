@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlmodel import SQLModel, create_engine
+
+from src.core import database
+from src.core.database import ReplicaSet, async_session, get_read_session
+
+
+@pytest.fixture
+def replica_urls(tmp_path):
+    """Two empty SQLite files with the schema, standing in for replicas"""
+    urls = []
+    for name in ("replica-a", "replica-b"):
+        url = f"sqlite:///{tmp_path / name}.db"
+        engine = create_engine(url)
+        SQLModel.metadata.create_all(engine)
+        engine.dispose()
+        urls.append(url)
+    return urls
+
+
+@pytest.mark.anyio
+async def test_reads_go_round_robin_over_the_healthy_replicas(
+    replica_urls, tmp_path
+):
+    down = f"sqlite:///{tmp_path / 'missing' / 'replica-c'}.db"
+    replicas = ReplicaSet([*replica_urls, down])
+    try:
+        await replicas.check()
+        chosen = [str(replicas.choose().url) for _ in range(4)]
+    finally:
+        await replicas.stop()
+
+    assert replicas.healthy == [True, True, False]
+    assert chosen == [str(engine.url) for engine in replicas.engines[:2]] * 2
+
+
+@pytest.mark.anyio
+async def test_reads_fall_back_to_the_primary_without_a_healthy_replica(
+    monkeypatch, tmp_path
+):
+    replicas = ReplicaSet([f"sqlite:///{tmp_path / 'missing' / 'r'}.db"])
+    monkeypatch.setattr(database, "replicas", replicas)
+    try:
+        await replicas.check()
+        async with async_session() as primary:
+            reads = get_read_session(primary)
+            assert await reads.__anext__() is primary
+            await reads.aclose()
+    finally:
+        await replicas.stop()
+
+    assert replicas.choose() is None
+
+
+def test_booking_is_answered_from_the_primary(
+    client, login, replica_urls, monkeypatch
+):
+    replicas = ReplicaSet(replica_urls)
+    monkeypatch.setattr(database, "replicas", replicas)
+    headers = login("patient-0")
+    when = datetime.now() + timedelta(days=900)
+    try:
+        booked = client.post(
+            "/appointment/book",
+            json={
+                "appointment_date": when.strftime("%Y-%m-%d"),
+                "appointment_time": when.strftime("%H:%M"),
+            },
+            headers=headers,
+        )
+        # The listing is a plain read, served by the empty replicas
+        listed = client.get("/appointment/mine", headers=headers)
+    finally:
+        client.portal.call(replicas.stop)
+
+    assert booked.status_code == 200
+    assert booked.json()["appointment"]["scheduled_time"].startswith(
+        when.strftime("%Y-%m-%dT%H:%M")
+    )
+    assert listed.status_code == 200
+    assert listed.json()["appointments"] == []
@@ -0,0 +1,89 @@
+import uuid
+from datetime import datetime, timedelta
+
+from sqlmodel import func, select
+
+from src.api.appointment.model import Appointment, AppointmentStatus
+from src.api.ehr.model import EHR
+from src.core.database import async_session
+
+VITALS = {"temperature": 37.2, "blood_pressure": "120/80", "heart_rate": 72}
+
+
+async def add_appointment(patient_id, status, ehr_status=None) -> uuid.UUID:
+    async with async_session() as session:
+        appointment = Appointment(
+            patient_id=patient_id,
+            scheduled_time=datetime.now() + timedelta(days=800),
+            status=status,
+        )
+        session.add(appointment)
+        if ehr_status is not None:
+            session.add(
+                EHR(
+                    patient_id=patient_id,
+                    appointment_id=appointment.id,
+                    status=ehr_status,
+                )
+            )
+        await session.commit()
+        return appointment.id
+
+
+async def ehr_count(appointment_id) -> int:
+    async with async_session() as session:
+        statement = select(func.count()).where(
+            EHR.appointment_id == appointment_id
+        )
+        return (await session.exec(statement)).one()
+
+
+def test_a_retried_post_updates_the_same_ehr(client, dataset, login):
+    appointment_id = client.portal.call(
+        add_appointment, dataset.patients[0]["id"], AppointmentStatus.PENDING
+    )
+
+    for heart_rate in (72, 90):
+        response = client.post(
+            f"/ehr/vitals/{appointment_id}",
+            json={**VITALS, "heart_rate": heart_rate},
+            headers=login("nurse-0"),
+        )
+        assert response.status_code == 200
+
+    assert client.portal.call(ehr_count, appointment_id) == 1
+
+
+def test_a_replayed_key_does_not_touch_the_database(
+    client, dataset, login, statements
+):
+    appointment_id = client.portal.call(
+        add_appointment, dataset.patients[0]["id"], AppointmentStatus.PENDING
+    )
+    headers = {**login("nurse-0"), "Idempotency-Key": str(uuid.uuid4())}
+    url = f"/ehr/vitals/{appointment_id}"
+
+    first = client.post(url, json=VITALS, headers=headers)
+    statements.clear()
+    replayed = client.post(url, json=VITALS, headers=headers)
+
+    assert replayed.status_code == 200
+    assert replayed.json() == first.json()
+    assert statements == []
+
+
+def test_vitals_for_a_completed_ehr_are_refused(client, dataset, login):
+    appointment_id = client.portal.call(
+        add_appointment,
+        dataset.patients[0]["id"],
+        AppointmentStatus.COMPLETED,
+        "completed",
+    )
+
+    response = client.post(
+        f"/ehr/vitals/{appointment_id}",
+        json=VITALS,
+        headers=login("nurse-0"),
+    )
+
+    assert response.status_code == 404
@@ -0,0 +1,73 @@
+import itertools
+import uuid
+
+import pytest
+
+from src.api.ehr.repository import EHRRepository
+from src.api.ehr.service import EHRService
+from src.api.sse.service import SSEService
+from src.core.database import async_session
+
+pytestmark = pytest.mark.anyio
+
+
+# Stands in for the broker's shared sequence
+event_ids = itertools.count(1)
+
+
+def publish(service: SSEService, recipient_id: str) -> int:
+    event_id = next(event_ids)
+    # What send_notification publishes for a targeted notification
+    service.deliver(
+        {
+            "id": event_id,
+            "priority": "normal",
+            "recipient_id": recipient_id,
+            "data": "{}",
+        }
+    )
+    return event_id
+
+
+async def test_reconnect_replaces_the_stale_stream():
+    service = SSEService()
+    client_id = str(uuid.uuid4())
+    await service.stream(client_id, "patient")
+    stale = service.clients[client_id]["queue"]
+    seen = publish(service, client_id)
+    missed = publish(service, client_id)
+
+    await service.stream(client_id, "patient", last_event_id=seen)
+    fresh = service.clients[client_id]["queue"]
+    # The old stream ends late, after the reconnect
+    service.remove_client(client_id, stale)
+    live = publish(service, client_id)
+
+    assert stale.closed and fresh is not stale
+    assert service.clients[client_id]["queue"] is fresh
+    assert [(await fresh.get()).id for _ in range(len(fresh))] == [
+        missed,
+        live,
+    ]
+
+
+def test_assigned_doctor_is_notified_on_their_user_stream(client, dataset):
+    doctor = dataset.doctors[0]
+    user_id = str(doctor["user_id"])
+    service = SSEService()
+
+    async def notify():
+        await service.stream(user_id, "doctor")
+        queue = service.clients[user_id]["queue"]
+        async with async_session() as session:
+            ehr_service = EHRService(EHRRepository(session))
+            await ehr_service._notify_assigned(doctor["id"], uuid.uuid4())
+        try:
+            return [(await queue.get()).frame for _ in range(len(queue))]
+        finally:
+            service.remove_client(user_id, queue)
+
+    frames = client.portal.call(notify)
+
+    assert len(frames) == 1
+    assert str(doctor["id"]).encode() in frames[0]
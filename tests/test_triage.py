@@ -0,0 +1,96 @@
+import json
+import time
+import uuid
+from datetime import datetime
+
+import pytest
+
+from src.api.appointment import triage
+from src.api.appointment.model import (
+    AppointmentStatus,
+    AppointmentType,
+    UrgencyLevel,
+)
+from src.api.appointment.triage import TriageIndex
+
+
+def booking(appointment_id: str, key: float, scheduled: float) -> dict:
+    # What track publishes for an open appointment
+    return {
+        "appointment_id": appointment_id,
+        "key": key,
+        "scheduled": scheduled,
+        "summary": json.dumps({"id": appointment_id}),
+    }
+
+
+def ids(index: TriageIndex, limit: int = 10) -> list:
+    return [json.loads(body)["id"] for body in index.top(limit)]
+
+
+def test_later_bookings_join_the_queue_when_they_come_due(monkeypatch):
+    now = time.time()
+    index = TriageIndex()
+    index.apply(booking("due", now - 60, now - 60))
+    index.apply(booking("urgent-later", now - 3600, now + 60))
+    index.apply(booking("canceled-later", now - 7200, now + 60))
+    index.apply({"appointment_id": "canceled-later"})
+
+    assert ids(index) == ["due"]
+    assert index.order == [(now - 60, now - 60, "due")]
+
+    monkeypatch.setattr(triage.time, "time", lambda: now + 120)
+
+    assert ids(index) == ["urgent-later", "due"]
+    assert ids(index, limit=1) == ["urgent-later"]
+    assert index.future == []
+
+
+def test_a_rebooked_appointment_is_queued_once(monkeypatch):
+    now = time.time()
+    index = TriageIndex()
+    later = booking("later", now, now + 60)
+    index.apply(later)
+    index.apply(later)
+
+    monkeypatch.setattr(triage.time, "time", lambda: now + 120)
+
+    assert ids(index) == ["later"]
+
+
+def test_long_free_text_stays_under_the_notify_limit():
+    summary = {
+        "id": uuid.uuid4(),
+        "patient_id": uuid.uuid4(),
+        "doctor_id": None,
+        "scheduled_time": datetime.now(),
+        "duration_minutes": 30,
+        "status": AppointmentStatus.PENDING,
+        "urgency_level": UrgencyLevel.LOW,
+        "type": AppointmentType.CONSULTATION,
+        "location": "\u00e9" * 5000,
+        "description": '"' * 5000,
+    }
+
+    message = TriageIndex()._message(summary)
+
+    assert len(json.dumps(message).encode()) < 8000
+    queued = json.loads(message["summary"])
+    assert len(queued["description"]) == triage.TEXT_PREVIEW_CHARS
+
+
+@pytest.mark.anyio
+async def test_messages_during_a_load_are_applied_on_top():
+    now = time.time()
+    index = TriageIndex()
+
+    async def query(session):
+        # Booked on another worker while the seeding query runs
+        index.apply(booking("during", now - 60, now - 60))
+        return []
+
+    index._query = query
+    await index.ready(session=None)
+
+    assert ids(index) == ["during"]
+    assert index.stats()["loads"] == 1
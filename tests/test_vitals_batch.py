@@ -0,0 +1,143 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlmodel import select
+
+from src.api.appointment.model import Appointment, AppointmentStatus
+from src.api.ehr.model import EHR
+from src.api.ehr.repository import EHRRepository
+from src.api.ehr.service import EHRService
+from src.core.database import async_session
+
+pytestmark = pytest.mark.anyio
+
+
+async def add_appointment(session, dataset, status, ehr_status=None):
+    appointment = Appointment(
+        patient_id=dataset.patients[0]["id"],
+        scheduled_time=datetime.now() + timedelta(days=700),
+        status=status,
+    )
+    session.add(appointment)
+    if ehr_status is not None:
+        session.add(
+            EHR(
+                patient_id=appointment.patient_id,
+                appointment_id=appointment.id,
+                status=ehr_status,
+                heart_rate=60,
+            )
+        )
+    await session.commit()
+    return appointment.id
+
+
+def reading(appointment_id, heart_rate: int = 70) -> dict:
+    return {
+        "appointment_id": str(appointment_id),
+        "temperature": 37.0,
+        "blood_pressure": "120/80",
+        "heart_rate": heart_rate,
+    }
+
+
+async def record(session, dataset, payload) -> dict:
+    service = EHRService(EHRRepository(session, session))
+    return await service.record_vitals_batch(payload, dataset.nurses[0]["id"])
+
+
+async def stored(session, appointment_id):
+    ehr = (
+        await session.exec(
+            select(EHR.status, EHR.heart_rate).where(
+                EHR.appointment_id == appointment_id
+            )
+        )
+    ).one()
+    appointment_status = (
+        await session.exec(
+            select(Appointment.status).where(Appointment.id == appointment_id)
+        )
+    ).one()
+    return ehr.status, ehr.heart_rate, appointment_status
+
+
+async def test_errors_keep_the_index_of_their_row(dataset):
+    async with async_session() as session:
+        first = await add_appointment(
+            session, dataset, AppointmentStatus.PENDING
+        )
+        last = await add_appointment(
+            session, dataset, AppointmentStatus.PENDING
+        )
+        payload = [
+            reading(first),
+            {**reading(first), "temperature": "hot"},
+            reading(uuid.uuid4()),
+            reading(last),
+        ]
+
+        result = await record(session, dataset, payload)
+
+    assert result["recorded"] == 2
+    assert [error["index"] for error in result["errors"]] == [1, 2]
+    assert result["errors"][0]["detail"].startswith("temperature: ")
+    assert result["errors"][1]["detail"] == "Appointment not found"
+
+
+async def test_the_last_reading_of_an_appointment_wins(dataset):
+    async with async_session() as session:
+        appointment_id = await add_appointment(
+            session, dataset, AppointmentStatus.PENDING
+        )
+        payload = [reading(appointment_id, 80), reading(appointment_id, 90)]
+
+        result = await record(session, dataset, payload)
+
+        assert result["errors"] == []
+        assert await stored(session, appointment_id) == (
+            "vitals_recorded",
+            90,
+            AppointmentStatus.VITALS_RECORDED,
+        )
+
+
+async def test_completed_ehrs_are_left_as_they_are(dataset):
+    async with async_session() as session:
+        completed = await add_appointment(
+            session, dataset, AppointmentStatus.COMPLETED, "completed"
+        )
+        pending = await add_appointment(
+            session, dataset, AppointmentStatus.PENDING
+        )
+
+        result = await record(
+            session, dataset, [reading(pending), reading(completed)]
+        )
+
+        assert result == {
+            "recorded": 1,
+            "errors": [{"index": 1, "detail": "EHR is completed"}],
+        }
+        assert await stored(session, completed) == (
+            "completed",
+            60,
+            AppointmentStatus.COMPLETED,
+        )
+
+
+async def test_only_pending_appointments_move_to_vitals_recorded(dataset):
+    async with async_session() as session:
+        diagnosed = await add_appointment(
+            session, dataset, AppointmentStatus.DIAGNOSED, "diagnosed"
+        )
+
+        result = await record(session, dataset, [reading(diagnosed, 75)])
+
+        assert result["errors"] == []
+        assert await stored(session, diagnosed) == (
+            "diagnosed",
+            75,
+            AppointmentStatus.DIAGNOSED,
+        )